@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Local audio file server
+Serves Azan audio files from the audio directory to the Sonos speakers over
+plain HTTP so playback starts from the LAN instead of a Spotify lookup. Supports
+HEAD, single byte ranges (Sonos seeks and resumes with Range requests),
+ETag/Last-Modified revalidation and sends file bodies with os.sendfile.
+"""
+
+import email.utils
+import logging
+import mimetypes
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+import metrics
+import state_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = os.path.join(state_store.DATA_DIR, 'audio')
+DEFAULT_PORT = 8766
+
+# Files don't change often; speakers and proxies may reuse them for a day
+CACHE_CONTROL = 'public, max-age=86400'
+
+# Largest chunk handed to one sendfile call
+SENDFILE_CHUNK = 1 << 20
+
+# Formats Sonos plays that mimetypes doesn't always know
+AUDIO_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+    '.wav': 'audio/wav',
+}
+
+AUDIO_REQUESTS_TOTAL = metrics.counter(
+    'azan_audio_requests_total', 'Local audio server responses by status', labels=('status',))
+AUDIO_BYTES_TOTAL = metrics.counter('azan_audio_bytes_total', 'Audio bytes sent to speakers')
+
+
+def content_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    return AUDIO_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def resolve(directory, name):
+    """Absolute path of an audio file inside directory, or None if missing or outside it"""
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name.lstrip('/')))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def local_address(peer):
+    """This host's address on the interface used to reach peer (no packets are sent)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.connect((peer, 1400))
+        return probe.getsockname()[0]
+
+
+def file_url(host, port, name):
+    return f"http://{host}:{port}/{quote(name)}"
+
+
+def didl_metadata(url, title=None):
+    """DIDL-Lite metadata for a served file, so Sonos knows its format and shows a title"""
+    path = unquote(urlsplit(url).path)
+    title = title or os.path.splitext(os.path.basename(path))[0]
+    return (
+        '<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+        'xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" '
+        'xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">'
+        f'<item id="{escape(quote(path))}" parentID="-1" restricted="true">'
+        f'<dc:title>{escape(title)}</dc:title>'
+        '<upnp:class>object.item.audioItem.musicTrack</upnp:class>'
+        f'<res protocolInfo="http-get:*:{content_type(path)}:*">{escape(url)}</res>'
+        '</item></DIDL-Lite>'
+    )
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range; None to serve the whole file
+
+    Raises ValueError for a range that can't be satisfied.
+    """
+    unit, _, ranges = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None  # Multiple ranges are optional; send the whole file
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None  # Malformed; ignore the header
+    if not first:
+        # Suffix range: the last length bytes ("bytes=-0" asks for none)
+        if length <= 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+class _AudioHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.serve(body=False)
+
+    def do_GET(self):
+        self.serve(body=True)
+
+    def respond(self, status, headers=()):
+        AUDIO_REQUESTS_TOTAL.inc(status=status)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def serve(self, body):
+        path = resolve(self.server.directory, unquote(urlsplit(self.path).path))
+        if not path:
+            self.respond(404, [('Content-Length', '0')])
+            return
+
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            etag = f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{size:x}"'
+            headers = [
+                ('Content-Type', content_type(path)),
+                ('Accept-Ranges', 'bytes'),
+                ('ETag', etag),
+                ('Last-Modified', email.utils.formatdate(st.st_mtime, usegmt=True)),
+                ('Cache-Control', CACHE_CONTROL),
+            ]
+
+            if self.headers.get('If-None-Match') == etag:
+                self.respond(304, headers)
+                return
+
+            status, start, end = 200, 0, size - 1
+            range_header = self.headers.get('Range')
+            if range_header and self.headers.get('If-Range', etag) == etag:
+                try:
+                    requested = _parse_range(range_header, size)
+                except ValueError:
+                    self.respond(416, [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')])
+                    return
+                if requested:
+                    status, (start, end) = 206, requested
+                    headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+
+            length = max(0, end - start + 1)
+            self.respond(status, headers + [('Content-Length', str(length))])
+            if body and length:
+                self.send_file(f, start, length)
+
+    def send_file(self, f, offset, length):
+        """Copy a byte range of f to the client, in the kernel where possible"""
+        self.wfile.flush()
+        try:
+            if hasattr(os, 'sendfile'):
+                remaining = length
+                while remaining:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset,
+                                       min(remaining, SENDFILE_CHUNK))
+                    if not sent:
+                        break
+                    offset += sent
+                    remaining -= sent
+            else:
+                f.seek(offset)
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(remaining, SENDFILE_CHUNK))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            AUDIO_BYTES_TOTAL.inc(length - remaining)
+            if remaining:
+                # The file shrank under us; the promised Content-Length can't be met
+                self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            # Speakers routinely drop a connection once they have buffered enough
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def start_http_server(directory=DEFAULT_DIRECTORY, port=DEFAULT_PORT, host='0.0.0.0'):
+    """Serve the audio directory on a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _AudioHandler)
+    server.daemon_threads = True
+    server.directory = directory
+    threading.Thread(target=server.serve_forever, name='audio-server', daemon=True).start()
+    logger.info(f"Serving Azan audio from {directory} on port {port}")
+    return server
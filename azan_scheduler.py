@@ -4,15 +4,36 @@ Azan Scheduler for Sonos
 Fetches prayer times from Aladhan API and plays Azan on Sonos at scheduled times
 """
 
+import functools
 import json
 import logging
+import socket
+import threading
 import time
 import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-import requests
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
 import soco
+from requests.exceptions import RequestException
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.date import DateTrigger
+import audio_server
+import control_channel
+import leader_election
+import metrics
+import playback_history
+import prayer_cache
+import schedule_store
+import speaker_cache
+import state_store
+from metrics import (PLAYBACK_STAGE_SECONDS, PRAYER_TIMES_FETCH_SECONDS, PRAYERS_TOTAL,
+                     SCHEDULER_LAG_SECONDS)
 
 # Set up logging
 logging.basicConfig(
@@ -23,75 +44,354 @@ logger = logging.getLogger(__name__)
 
 # Use script directory for state file
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-STATE_FILE = os.path.join(SCRIPT_DIR, 'scheduler_state.json')
+STATE_FILE = state_store.STATE_FILE
+
+# Give up waiting on a speaker after this many seconds
+SPEAKER_TIMEOUT = 10
+
+# Seconds between background rediscoveries of the Sonos speakers (refreshes speaker_cache.json)
+REVALIDATE_SECONDS = 3600
+
+# Start the play job this many seconds early and wait out the rest precisely
+TRIGGER_LEAD_SECONDS = 1.0
+
+# A job that starts late (throttled Pi, clock step) still runs within this many seconds
+MISFIRE_GRACE_SECONDS = 120
+
+# Sleep in slices no longer than this so a wall-clock step is noticed, and spin the last bit
+TIMER_SLICE_SECONDS = 0.25
+TIMER_SPIN_SECONDS = 0.002
+
+# Seconds between checks of config.json for changes
+CONFIG_CHECK_SECONDS = 2
+
+# Config sections that are only read at startup
+RESTART_SECTIONS = ('control', 'metrics', 'web', 'ha')
+
+# Seconds between attempts when the daily refresh fails (the last one repeats)
+REFRESH_RETRY_DELAYS = (15, 30, 60, 120, 300, 600)
+
+SPEAKER_FAILURES_TOTAL = metrics.counter(
+    'azan_speaker_failures_total', 'Failed playback attempts per speaker', labels=('speaker',))
+TRIGGER_JITTER_SECONDS = metrics.histogram(
+    'azan_trigger_jitter_seconds', 'Prayer fire time minus its scheduled time',
+    buckets=(-0.01, -0.001, 0, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120))
+
+
+def wait_until(target):
+    """Block until the wall-clock time target (returns at once if it has passed)
+
+    Sleeps in short slices, re-reading the wall clock each time so an NTP step
+    while waiting is followed, then spins out the last couple of milliseconds
+    on the monotonic clock.
+    """
+    while True:
+        remaining = (target - datetime.now(target.tzinfo)).total_seconds()
+        if remaining <= TIMER_SPIN_SECONDS:
+            break
+        time.sleep(min(remaining - TIMER_SPIN_SECONDS, TIMER_SLICE_SECONDS))
+
+    deadline = time.monotonic() + remaining
+    while time.monotonic() < deadline:
+        pass
+
+
+@contextmanager
+def timed_stage(stage, stages=None):
+    """Time a playback stage into the stage histogram and, if given, add it to stages[stage]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PLAYBACK_STAGE_SECONDS.observe(elapsed, stage=stage)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0) + elapsed
+
+
+class _SiteLogger(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        return f"[{self.extra['site']}] {msg}", kwargs
+
+
+def site_config(config, site):
+    """A site's effective config: its own sections over the top-level defaults"""
+    merged = dict(config)
+    merged.pop('sites', None)
+    for section, value in site.items():
+        if isinstance(value, dict) and isinstance(config.get(section), dict):
+            merged[section] = dict(config[section], **value)
+        else:
+            merged[section] = value
+    return merged
+
+
+def config_diff(old, new, path=''):
+    """List (dotted path, old value, new value) for every setting that differs (comments ignored)"""
+    changes = []
+    for key in sorted(set(old) | set(new)):
+        if key.startswith('_'):
+            continue
+        before, after = old.get(key), new.get(key)
+        key_path = f"{path}.{key}" if path else key
+        if isinstance(before, dict) and isinstance(after, dict):
+            changes.extend(config_diff(before, after, key_path))
+        elif before != after:
+            changes.append((key_path, before, after))
+    return changes
+
+
+def speaker_identity(config):
+    """What decides which speakers a config connects to (everything but volumes)"""
+    sonos_config = config.get('sonos', {})
+    entries = [{'name': entry} if isinstance(entry, str) else
+               {key: value for key, value in entry.items() if key != 'volume'}
+               for entry in sonos_config.get('speakers') or []]
+    if entries:
+        return entries
+    return [sonos_config.get('speaker_ip'), sonos_config.get('speaker_name')]
 
 
 class AzanScheduler:
-    def __init__(self, config_file='config.json'):
-        """Initialize the Azan Scheduler"""
-        with open(config_file, 'r') as f:
-            self.config = json.load(f)
+    def __init__(self, config_file='config.json', site=None, parent=None):
+        """Initialize the Azan Scheduler
+
+        With a "sites" list in config.json this instance runs one child
+        AzanScheduler per site; the children share its APScheduler (one timer
+        queue), Sonos thread pool, control channel and prayer times cache.
+        """
+        self.parent = parent
+        self.elector = None
+        if parent:
+            self.config = site_config(parent.config, site)
+            self.name = site['name']
+            self.log = _SiteLogger(logger, {'site': self.name})
+            self.scheduler = parent.scheduler
+            self.executor = parent.executor
+        else:
+            self.config_file = config_file
+            with open(config_file, 'r') as f:
+                self.config = json.load(f)
+            self.name = None
+            self.log = logger
+            grace = self.config.get('azan', {}).get('misfire_grace_seconds', MISFIRE_GRACE_SECONDS)
+            self.scheduler = BlockingScheduler(job_defaults={'misfire_grace_time': grace, 'coalesce': True})
+            self.scheduler.add_listener(self.record_lag, EVENT_JOB_SUBMITTED)
+            self.scheduler.add_listener(self.record_missed, EVENT_JOB_MISSED)
+            self.executor = ThreadPoolExecutor(max_workers=self.config.get('sonos', {}).get('max_workers', 8),
+                                               thread_name_prefix='sonos')
 
-        self.scheduler = BlockingScheduler()
+        timezone = self.config.get('location', {}).get('timezone')
+        self.tz = ZoneInfo(timezone) if timezone and ZoneInfo else None
         self.sonos_device = None
+        self.speakers = []
         self.prayer_times = {}
+        self.fired = set()
+        self.reported = set()
+        self.prepared = {}
+        self.plans = {}
+        self.pause_lock = threading.RLock()
+        self.applied_pause = None
+        self.control_server = None
+        self.audio_server = None
+
+        if parent or not self.config.get('sites'):
+            self.sites = [self]
+        else:
+            self.sites = [AzanScheduler(site=site, parent=self) for site in self.config['sites']]
+
+    def job_id(self, kind, prayer=None):
+        """Job id for this site, e.g. azan_Fajr (or azan_Fajr@home when running several sites)"""
+        job_id = f"{kind}_{prayer}" if prayer else kind
+        return f"{job_id}@{self.name}" if self.name else job_id
+
+    def owns(self, job):
+        """True if a scheduler job belongs to this site"""
+        return job.id.partition('@')[2] == (self.name or '')
+
+    def is_leader(self):
+        """False only while another replica holds the HA lease"""
+        elector = (self.parent or self).elector
+        return not elector or elector.is_leader
+
+    def fired_key(self, prayer, prayer_time):
+        """How a fired prayer is published in the HA lease, e.g. 2026-03-01 Fajr@home"""
+        return f"{prayer_time.date().isoformat()} {prayer}{'@' + self.name if self.name else ''}"
+
+    def record(self, event, prayer, **detail):
+        """Add an event for one of today's prayers to the playback history"""
+        playback_history.record(event, prayer, site=self.name, scheduled=self.prayer_times.get(prayer), **detail)
+
+    def record_skip(self, event, prayer, **detail):
+        """Count and record a prayer that won't play, once per day however often it is rescheduled"""
+        prayer_time = self.prayer_times.get(prayer)
+        key = (prayer_time.date().isoformat() if prayer_time else None, prayer, event)
+        if key in self.reported:
+            return
+        self.reported = {reported for reported in self.reported if reported[0] == key[0]}
+        self.reported.add(key)
+        PRAYERS_TOTAL.inc(outcome='skipped')
+        self.record(event, prayer, **detail)
 
     def discover_sonos(self):
-        """Discover and connect to Sonos speaker"""
+        """Connect to the configured Sonos speaker(s)
+
+        Speakers found by name are looked up in speaker_cache.json first, so a
+        full SSDP discovery only runs when the cache doesn't know them.
+        """
         try:
+            sonos_config = self.config['sonos']
+            default_volume = sonos_config.get('volume', 30)
+            self.sonos_device = None
+
+            if sonos_config.get('speakers'):
+                self.speakers = self.connect_speakers(sonos_config['speakers'], default_volume)
+                if not self.speakers:
+                    raise Exception("None of the configured speakers were found")
+                self.sonos_device = self.speakers[0]['device']
+                self.log.info(f"Connected to {len(self.speakers)} Sonos speaker(s): "
+                            f"{', '.join(speaker['name'] for speaker in self.speakers)}")
+                return True
+
             # Try to connect to specific IP if provided
-            if self.config['sonos'].get('speaker_ip'):
-                logger.info(f"Connecting to Sonos at {self.config['sonos']['speaker_ip']}")
-                self.sonos_device = soco.SoCo(self.config['sonos']['speaker_ip'])
+            if sonos_config.get('speaker_ip'):
+                self.log.info(f"Connecting to Sonos at {sonos_config['speaker_ip']}")
+                record = speaker_cache.find(ip=sonos_config['speaker_ip'])
+                self.sonos_device = soco.SoCo(sonos_config['speaker_ip'])
             else:
-                # Auto-discover
-                logger.info("Discovering Sonos speakers...")
-                devices = list(soco.discover())
-                if not devices:
-                    raise Exception("No Sonos speakers found on network")
-
-                # Find by name or use first device
-                speaker_name = self.config['sonos'].get('speaker_name')
-                if speaker_name:
-                    for device in devices:
-                        if device.player_name == speaker_name:
-                            self.sonos_device = device
-                            break
-
-                if not self.sonos_device:
-                    self.sonos_device = devices[0]
-
-            logger.info(f"Connected to Sonos: {self.sonos_device.player_name}")
+                # Find by name (or use the first speaker), from the cache if possible
+                speaker_name = sonos_config.get('speaker_name')
+                record = speaker_cache.find(name=speaker_name)
+                if record:
+                    self.log.info(f"Connecting to cached Sonos at {record['ip']}")
+                else:
+                    self.log.info("Discovering Sonos speakers...")
+                    found = speaker_cache.discover(networks=speaker_cache.configured_networks(self.config))
+                    if not found:
+                        raise Exception("No Sonos speakers found on network")
+                    record = speaker_cache.find(name=speaker_name) or next(iter(found.values()))
+                self.sonos_device = soco.SoCo(record['ip'])
+
+            player_name = record['name'] if record else self.sonos_device.player_name
+            self.speakers = [{'name': player_name, 'device': self.sonos_device, 'volume': default_volume,
+                              'uid': record['uid'] if record else None}]
+            self.log.info(f"Connected to Sonos: {player_name}")
             return True
 
         except Exception as e:
-            logger.error(f"Failed to connect to Sonos: {e}")
+            self.log.error(f"Failed to connect to Sonos: {e}")
             return False
 
-    def fetch_prayer_times(self):
-        """Fetch prayer times from Aladhan API"""
-        try:
-            city = self.config['location']['city']
-            country = self.config['location']['country']
-            method = self.config['location'].get('method', 2)
+    def connect_speakers(self, entries, default_volume):
+        """Resolve sonos.speakers entries (room names or {name/ip, volume}) to devices"""
+        discovered = False
+        speakers = []
+
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            volume = entry.get('volume', default_volume)
+
+            if entry.get('ip'):
+                record = speaker_cache.find(ip=entry['ip'])
+                ip = entry['ip']
+            else:
+                record = speaker_cache.find(name=entry['name'])
+                if not record and not discovered:
+                    self.log.info("Discovering Sonos speakers...")
+                    speaker_cache.discover(networks=speaker_cache.configured_networks(self.config))
+                    discovered = True
+                    record = speaker_cache.find(name=entry['name'])
+                if not record:
+                    self.log.warning(f"Sonos speaker '{entry['name']}' not found")
+                    continue
+                ip = record['ip']
+
+            speakers.append({'name': entry.get('name') or entry['ip'], 'device': soco.SoCo(ip),
+                             'volume': volume, 'uid': record['uid'] if record else None})
+
+        return speakers
+
+    def update_volumes(self):
+        """Re-read speaker volumes from the config without reconnecting"""
+        sonos_config = self.config['sonos']
+        default_volume = sonos_config.get('volume', 30)
+        volumes = {}
+        for entry in sonos_config.get('speakers') or []:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            volumes[entry.get('name') or entry['ip']] = entry.get('volume', default_volume)
+        for speaker in self.speakers:
+            speaker['volume'] = volumes.get(speaker['name'], default_volume)
+
+    def relocate_speaker(self, speaker, records):
+        """Point a speaker at its current IP from discovery results; True if it moved"""
+        record = records.get(speaker.get('uid')) if speaker.get('uid') else None
+        if not record:
+            record = next((record for record in records.values() if record['name'] == speaker['name']), None)
+        if not record or record['ip'] == speaker['device'].ip_address:
+            return False
+
+        self.log.info(f"Sonos speaker {speaker['name']} is now at {record['ip']} "
+                      f"(was {speaker['device'].ip_address})")
+        device = soco.SoCo(record['ip'])
+        if speaker['device'] is self.sonos_device:
+            self.sonos_device = device
+        speaker['device'] = device
+        speaker['uid'] = record['uid']
+        return True
+
+    def update_speakers(self, records):
+        """Speaker cache listener: follow speakers that moved to a new IP"""
+        for speaker in self.speakers:
+            self.relocate_speaker(speaker, records)
 
-            # Get today's date
-            today = datetime.now()
+    def for_each_speaker(self, action, *args):
+        """Run action(speaker, *args) on all speakers concurrently
 
-            # Build API URL
-            url = f"http://api.aladhan.com/v1/timingsByCity"
-            params = {
-                'city': city,
-                'country': country,
-                'method': method
-            }
+        Returns {speaker name: {'seconds', 'finished', 'result', 'error'}}. A speaker
+        that doesn't answer within SPEAKER_TIMEOUT is reported as timed out and
+        doesn't hold up the others.
+        """
+        def attempt(speaker):
+            try:
+                return action(speaker, *args)
+            except (RequestException, OSError):
+                # The speaker may have a new DHCP lease; find it again and retry once
+                records = speaker_cache.rediscover(networks=speaker_cache.configured_networks(self.config))
+                if not self.relocate_speaker(speaker, records):
+                    raise
+                return action(speaker, *args)
 
-            logger.info(f"Fetching prayer times for {city}, {country}")
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+        def timed(speaker):
+            started = time.monotonic()
+            try:
+                result, error = attempt(speaker), None
+            except Exception as e:
+                result, error = None, str(e)
+            finished = time.monotonic()
+            return {'seconds': finished - started, 'finished': finished, 'result': result, 'error': error}
 
-            data = response.json()
-            timings = data['data']['timings']
+        futures = {self.executor.submit(timed, speaker): speaker['name'] for speaker in self.speakers}
+        done, pending = wait(futures, timeout=SPEAKER_TIMEOUT)
+
+        results = {futures[future]: future.result() for future in done}
+        for future in pending:
+            results[futures[future]] = {'seconds': None, 'finished': None, 'result': None,
+                                        'error': f"timed out after {SPEAKER_TIMEOUT}s"}
+        return results
+
+    def fetch_prayer_times(self):
+        """Load today's prayer times from the shared prayer times cache"""
+        try:
+            location = self.config['location']
+
+            # Get today's date (in the site's timezone if it has one)
+            today = datetime.now(self.tz)
+
+            self.log.info(f"Loading prayer times for {location.get('city')}, {location.get('country')}")
+            with PRAYER_TIMES_FETCH_SECONDS.time(source='cache'):
+                timings = prayer_cache.get_timings(location, today.date())
 
             # Parse prayer times
             self.prayer_times = {}
@@ -99,26 +399,47 @@ class AzanScheduler:
                 time_str = timings[prayer].split(' ')[0]  # Remove timezone
                 prayer_time = datetime.strptime(f"{today.strftime('%Y-%m-%d')} {time_str}",
                                                '%Y-%m-%d %H:%M')
-                self.prayer_times[prayer] = prayer_time
+                self.prayer_times[prayer] = prayer_time.replace(tzinfo=self.tz)
 
-            logger.info("Prayer times fetched successfully:")
+            self.log.info("Prayer times fetched successfully:")
             for prayer, time in self.prayer_times.items():
-                logger.info(f"  {prayer}: {time.strftime('%I:%M %p')}")
+                self.log.info(f"  {prayer}: {time.strftime('%I:%M %p')}")
 
+            self.fired = set(schedule_store.save(self.name, today.date(), prayer_cache.cache_key(location),
+                                                 self.prayer_times))
             return True
 
         except Exception as e:
-            logger.error(f"Failed to fetch prayer times: {e}")
+            self.log.error(f"Failed to fetch prayer times: {e}")
             return False
 
-    def is_paused(self):
-        """Check if scheduler is paused"""
-        if not os.path.exists(STATE_FILE):
+    def restore_schedule(self):
+        """Load today's prayer times and fired prayers from schedule.json; False if it has none"""
+        stored = schedule_store.load(self.name, datetime.now(self.tz).date(),
+                                     prayer_cache.cache_key(self.config['location']))
+        if not stored:
             return False
+        self.prayer_times = stored['prayer_times']
+        self.fired = set(stored['fired'])
+        self.log.info(f"Restored today's schedule from {schedule_store.SCHEDULE_FILE}"
+                      f"{' (already fired: ' + ', '.join(sorted(self.fired)) + ')' if self.fired else ''}")
+        return True
+
+    def revalidate_schedule(self):
+        """After a restore, reload the prayer times and reschedule if they changed"""
+        restored = dict(self.prayer_times)
+        if not self.fetch_prayer_times():
+            self.prayer_times = restored
+            self.log.warning("Keeping the restored schedule; prayer times could not be reloaded")
+            return
+        if self.prayer_times != restored:
+            self.log.info("Prayer times differ from the restored schedule; rescheduling")
+            self.schedule_prayers()
 
+    def is_paused(self):
+        """Check if scheduler is paused"""
         try:
-            with open(STATE_FILE, 'r') as f:
-                state = json.load(f)
+            state = state_store.read_state()
 
             if not state.get('paused', False):
                 return False
@@ -129,141 +450,823 @@ class AzanScheduler:
                 pause_time = datetime.fromisoformat(pause_until)
                 if datetime.now() >= pause_time:
                     # Auto-resume
-                    state['paused'] = False
-                    state['pause_until'] = None
-                    with open(STATE_FILE, 'w') as f:
-                        json.dump(state, f)
+                    state_store.update_state(paused=False, pause_until=None)
                     return False
 
             return True
         except Exception as e:
-            logger.error(f"Error checking pause state: {e}")
+            self.log.error(f"Error checking pause state: {e}")
+            return False
+
+    def audio_directory(self):
+        """Directory the local audio server serves (audio.directory, relative to the data directory)"""
+        directory = self.config.get('audio', {}).get('directory')
+        return os.path.join(state_store.DATA_DIR, directory) if directory else audio_server.DEFAULT_DIRECTORY
+
+    def local_audio_source(self, name):
+        """Transport URI and DIDL metadata for a local audio file"""
+        if not audio_server.resolve(self.audio_directory(), name):
+            raise ValueError(f"Audio file not found: {name} (in {self.audio_directory()})")
+
+        audio_config = self.config.get('audio', {})
+        if not audio_config.get('port', audio_server.DEFAULT_PORT):
+            raise ValueError(f"Audio file {name} configured but the audio server is disabled (audio.port is 0)")
+        host = audio_config.get('host') or audio_server.local_address(self.speakers[0]['device'].ip_address)
+        uri = audio_server.file_url(host, audio_config.get('port', audio_server.DEFAULT_PORT), name)
+        # Local files need metadata describing their format
+        return {'uri': uri, 'metadata': audio_server.didl_metadata(uri)}
+
+    @staticmethod
+    def spotify_source(spotify_uri):
+        """Transport URI and DIDL metadata for a Spotify track"""
+        if not spotify_uri.startswith('spotify:track:') or not spotify_uri[len('spotify:track:'):].isalnum():
+            raise ValueError(f"Invalid Spotify URI: {spotify_uri}")
+
+        # Extract track ID
+        track_id = spotify_uri.replace('spotify:track:', '')
+
+        # Build Sonos-compatible Spotify URI (sid=9 is Spotify's service ID)
+        return {'uri': f'x-sonos-spotify:spotify%3atrack%3a{track_id}?sid=9&flags=8224', 'metadata': ''}
+
+    def compile_plan(self, prayer_name):
+        """Build a prayer's playback plan; raises ValueError if its config is unusable
+
+        A plan holds everything play_azan needs at T-0: the transport URI and
+        metadata, the Spotify fallback for a local file, and each speaker's volume.
+        """
+        prayer_config = self.config['azan']['prayers'].get(prayer_name, {})
+        spotify_uri = prayer_config.get('spotify_uri')
+
+        if prayer_config.get('file'):
+            source = self.local_audio_source(prayer_config['file'])
+            fallback = self.spotify_source(spotify_uri) if spotify_uri else None
+        elif spotify_uri:
+            source, fallback = self.spotify_source(spotify_uri), None
+        else:
+            raise ValueError(f"No Spotify URI or audio file configured for {prayer_name}")
+
+        volume = prayer_config.get('volume')
+        return {
+            'prayer': prayer_name,
+            'uri': source['uri'],
+            'metadata': source['metadata'],
+            'fallback': fallback,
+            'volumes': {speaker['name']: volume if volume is not None else speaker['volume']
+                        for speaker in self.speakers}
+        }
+
+    def compile_plans(self):
+        """Compile a playback plan for every enabled prayer; False if any is invalid"""
+        plans = {}
+        errors = []
+        for prayer, prayer_config in self.config['azan']['prayers'].items():
+            if not prayer_config.get('enabled', False):
+                continue
+            try:
+                plans[prayer] = self.compile_plan(prayer)
+            except ValueError as e:
+                errors.append(str(e))
+
+        for error in errors:
+            self.log.error(f"Invalid prayer config: {error}")
+        if errors:
             return False
+        self.plans = plans
+        return True
 
-    def play_azan(self, prayer_name):
-        """Play Azan track on Sonos"""
+    def plan_for(self, prayer_name):
+        """The compiled plan for a prayer, compiling on demand for ad-hoc plays"""
+        plan = self.plans.get(prayer_name)
+        if plan:
+            return plan
         try:
-            # Check if paused
+            return self.compile_plan(prayer_name)
+        except ValueError as e:
+            self.log.error(str(e))
+            return None
+
+    def load_azan(self, speaker, plan, source=None, stages=None):
+        """Set volume and load the Azan into a speaker's transport (stage seconds are added to stages)"""
+        device = speaker['device']
+        source = source or plan
+
+        # Set volume
+        with timed_stage('volume', stages):
+            device.volume = plan['volumes'].get(speaker['name'], speaker['volume'])
+
+        # Clear queue first
+        with timed_stage('clear_queue', stages):
+            device.clear_queue()
+
+        # Use SetAVTransportURI action
+        with timed_stage('set_transport_uri', stages):
+            device.avTransport.SetAVTransportURI([
+                ('InstanceID', 0),
+                ('CurrentURI', source['uri']),
+                ('CurrentURIMetaData', source['metadata'])
+            ])
+
+    def prepare_speaker(self, speaker, plan):
+        """Load the Azan on one speaker unless it is busy; returns True if loaded"""
+        # Also confirms the speaker is reachable
+        transport_state = speaker['device'].get_current_transport_info()['current_transport_state']
+
+        if transport_state == 'PLAYING':
+            # Don't cut off whatever is playing early; load at T-0 instead
+            return False
+
+        self.load_azan(speaker, plan)
+        return True
+
+    def play_speaker(self, speaker, plan, loaded, stages):
+        """Start the Azan on one speaker, loading it first if prepare didn't
+
+        If the local file can't be played, the plan's Spotify fallback is tried.
+        Seconds spent in each stage are added to stages[speaker name], failed
+        attempts and retries included.
+        """
+        stages = stages.setdefault(speaker['name'], {})
+        try:
+            if speaker['name'] not in loaded:
+                self.load_azan(speaker, plan, stages=stages)
+            with timed_stage('play', stages):
+                speaker['device'].play()
+        except Exception as e:
+            if not plan['fallback']:
+                raise
+            self.log.warning(f"  {speaker['name']}: {e}; falling back to Spotify")
+            self.load_azan(speaker, plan, plan['fallback'], stages=stages)
+            with timed_stage('play', stages):
+                speaker['device'].play()
+
+    def prepare_azan(self, prayer_name):
+        """Pre-warm the speakers shortly before a prayer so only play() is left at T-0"""
+        self.prepared.pop(prayer_name, None)
+        try:
+            if not self.is_leader():
+                return
+
             if self.is_paused():
-                logger.info(f"Skipping {prayer_name} - Scheduler is paused")
+                self.log.info(f"Not preparing {prayer_name} - Scheduler is paused")
                 return
 
-            if not self.sonos_device:
-                logger.error("Sonos device not connected")
+            if not self.speakers:
+                self.log.error("Sonos device not connected")
                 return
 
-            logger.info(f"Playing Azan for {prayer_name}")
+            plan = self.plan_for(prayer_name)
+            if not plan:
+                return
+
+            results = self.for_each_speaker(self.prepare_speaker, plan)
+            loaded = {name for name, outcome in results.items() if outcome['result']}
+            self.prepared[prayer_name] = {'plan': plan, 'loaded': loaded}
+
+            for name, outcome in results.items():
+                if outcome['error']:
+                    self.log.warning(f"Failed to prepare {prayer_name} on {name}: {outcome['error']}")
+                elif not outcome['result']:
+                    self.log.info(f"Prepared {prayer_name} on {name} (speaker busy, will load at prayer time)")
+            self.log.info(f"Prepared {prayer_name} (Azan loaded on {len(loaded)}/{len(results)} speakers)")
 
-            # Set volume
-            volume = self.config['sonos'].get('volume', 30)
-            self.sonos_device.volume = volume
+        except Exception as e:
+            self.log.warning(f"Failed to prepare Azan for {prayer_name}: {e}")
 
-            # Get Spotify URI for this specific prayer
-            prayer_config = self.config['azan']['prayers'].get(prayer_name, {})
-            spotify_uri = prayer_config.get('spotify_uri')
+    def play_azan(self, prayer_name, jitter=None):
+        """Play Azan track on all configured Sonos speakers"""
+        prepared = self.prepared.pop(prayer_name, None)
+        scheduled = self.prayer_times.get(prayer_name)
+        try:
+            # Check if paused
+            if self.is_paused():
+                self.log.info(f"Skipping {prayer_name} - Scheduler is paused")
+                PRAYERS_TOTAL.inc(outcome='paused')
+                self.record('paused', prayer_name)
+                return
 
-            if not spotify_uri:
-                logger.error(f"No Spotify URI configured for {prayer_name}")
+            if not self.speakers:
+                self.log.error("Sonos device not connected")
+                PRAYERS_TOTAL.inc(outcome='failed')
+                self.record('failed', prayer_name, reason='no speakers connected')
                 return
 
-            # For Spotify URIs, use direct SOAP calls
-            if spotify_uri.startswith('spotify:track:'):
-                # Extract track ID
-                track_id = spotify_uri.replace('spotify:track:', '')
+            self.log.info(f"Playing Azan for {prayer_name}")
 
-                # Build Sonos-compatible Spotify URI (sid=9 is Spotify's service ID)
-                uri = f'x-sonos-spotify:spotify%3atrack%3a{track_id}?sid=9&flags=8224'
+            plan = prepared['plan'] if prepared else self.plan_for(prayer_name)
+            if not plan:
+                PRAYERS_TOTAL.inc(outcome='failed')
+                self.record('failed', prayer_name, reason='no playback plan')
+                return
+            loaded = prepared['loaded'] if prepared else set()
 
-                # Clear queue first
-                self.sonos_device.clear_queue()
+            fired_at = datetime.now(self.tz)
+            fired = time.monotonic()
+            stages = {speaker['name']: {} for speaker in self.speakers}
+            results = self.for_each_speaker(self.play_speaker, plan, loaded, stages)
 
-                # Use SetAVTransportURI action
-                self.sonos_device.avTransport.SetAVTransportURI([
-                    ('InstanceID', 0),
-                    ('CurrentURI', uri),
-                    ('CurrentURIMetaData', '')
-                ])
+            finished = []
+            for name, outcome in results.items():
+                if outcome['error']:
+                    self.log.error(f"  {name}: failed to play Azan: {outcome['error']}")
+                    SPEAKER_FAILURES_TOTAL.inc(speaker=name)
+                else:
+                    finished.append(outcome['finished'])
+                    self.log.info(f"  {name}: playing in {outcome['seconds']:.2f}s "
+                                f"({'pre-warmed' if name in loaded else 'cold'})")
 
-                # Play
-                self.sonos_device.play()
+            # A copy: a timed-out speaker's thread may still be adding to its stages
+            speakers = {name: {'seconds': outcome['seconds'], 'error': outcome['error'],
+                               'prewarmed': name in loaded, 'stages': dict(stages.get(name, {}))}
+                        for name, outcome in results.items()}
+            if not finished:
+                self.log.error(f"Failed to play Azan for {prayer_name} on any speaker")
+                PRAYERS_TOTAL.inc(outcome='failed')
+                self.record('failed', prayer_name, reason='no speaker played', uri=plan['uri'],
+                            jitter=jitter, speakers=speakers)
+                return
 
-            else:
-                logger.error(f"Invalid Spotify URI: {spotify_uri}")
+            PRAYERS_TOTAL.inc(outcome='played')
 
-            logger.info(f"Azan playing for {prayer_name}")
+            fan_out = max(finished) - fired
+            skew = max(finished) - min(finished)
+            onset = ""
+            onset_seconds = None
+            if scheduled:
+                onset_seconds = (fired_at - scheduled).total_seconds() + fan_out
+                onset = f", onset latency {onset_seconds:.2f}s"
+            self.log.info(f"Azan playing for {prayer_name} on {len(finished)}/{len(results)} speakers "
+                        f"(fan-out {fan_out:.2f}s, skew {skew:.2f}s{onset})")
+            self.record('played', prayer_name, uri=plan['uri'], jitter=jitter, fan_out=fan_out, skew=skew,
+                        onset=onset_seconds, speakers=speakers)
 
         except Exception as e:
-            logger.error(f"Failed to play Azan: {e}")
+            self.log.error(f"Failed to play Azan: {e}")
+            PRAYERS_TOTAL.inc(outcome='failed')
+            self.record('failed', prayer_name, reason=str(e))
 
-    def schedule_prayers(self):
-        """Schedule Azan for prayer times"""
-        try:
-            # Remove existing jobs
-            self.scheduler.remove_all_jobs()
+    def fire_azan(self, prayer_name, scheduled):
+        """Play job: wait out the lead precisely, record the jitter, then play"""
+        wait_until(scheduled)
+        if not self.is_leader():
+            # Not marked fired: if the leader is gone, taking over catches this one up
+            self.log.info(f"Not playing {prayer_name}: standby ({(self.parent or self).elector.holder} is the leader)")
+            self.record('standby', prayer_name)
+            return
+        jitter = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+        TRIGGER_JITTER_SECONDS.observe(jitter)
+        if abs(jitter) >= 1:
+            self.log.warning(f"{prayer_name} fired {jitter:+.3f}s from its scheduled time")
+        else:
+            self.log.info(f"{prayer_name} fired {jitter * 1000:+.2f}ms from its scheduled time")
+        # Marked fired before playing, so a crash or kill mid-Azan can't replay it
+        # after a restart or takeover; the file write (an fsync) runs alongside playback
+        self.fired.add(prayer_name)
+        threading.Thread(target=schedule_store.mark_fired, args=(self.name, scheduled.date(), prayer_name),
+                         name='mark-fired', daemon=True).start()
+        elector = (self.parent or self).elector
+        if elector:
+            elector.note_fired(self.fired_key(prayer_name, scheduled))
+        self.play_azan(prayer_name, jitter)
 
-            prayers_config = self.config['azan']['prayers']
-            now = datetime.now()
+    def schedule_prayers(self, catch_up=False):
+        """Schedule Azan for prayer times
 
-            for prayer, prayer_time in self.prayer_times.items():
-                # Check if this prayer is enabled
-                prayer_settings = prayers_config.get(prayer, {})
-                if not prayer_settings.get('enabled', False):
-                    logger.info(f"Skipped {prayer} (disabled in config)")
-                    continue
+        With catch_up (at startup), a prayer that passed within the misfire
+        grace time and hasn't fired yet is played straight away.
+        """
+        try:
+            # Remove this site's existing jobs, except a pending retry of a failed refresh
+            for job in self.scheduler.get_jobs():
+                if self.owns(job) and job.id != self.job_id('refresh_retry'):
+                    job.remove()
 
-                # Only schedule if time is in the future
-                if prayer_time > now:
-                    self.scheduler.add_job(
-                        self.play_azan,
-                        DateTrigger(run_date=prayer_time),
-                        args=[prayer],
-                        id=f'azan_{prayer}'
-                    )
-                    logger.info(f"Scheduled {prayer} at {prayer_time.strftime('%I:%M %p')}")
-                else:
-                    logger.info(f"Skipped {prayer} (time has passed)")
+            now = datetime.now(self.tz)
+            self.prepared = {}
+
+            for prayer in self.prayer_times:
+                self.schedule_prayer(prayer, now, catch_up)
 
             # Schedule daily prayer time refresh at midnight
             tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=1, second=0)
             self.scheduler.add_job(
                 self.refresh_schedule,
                 DateTrigger(run_date=tomorrow),
-                id='daily_refresh'
+                id=self.job_id('daily_refresh'),
+                misfire_grace_time=None  # However late, tomorrow still needs its jobs
+            )
+            self.log.info(f"Scheduled daily refresh at {tomorrow.strftime('%I:%M %p')}")
+
+            # New jobs start out active; suspend them if we're paused
+            self.applied_pause = None
+            self.apply_pause_state()
+
+        except Exception as e:
+            self.log.error(f"Failed to schedule prayers: {e}")
+
+    def schedule_prayer(self, prayer, now, catch_up=False):
+        """Add the prepare/play jobs for one prayer if it is enabled and still ahead"""
+        prayer_time = self.prayer_times[prayer]
+        prepare_seconds = self.config['azan'].get('prepare_seconds', 30)
+        # Per job rather than the scheduler default, so a reload can change it
+        grace = self.config['azan'].get('misfire_grace_seconds', MISFIRE_GRACE_SECONDS)
+
+        # Check if this prayer is enabled
+        prayer_settings = self.config['azan']['prayers'].get(prayer, {})
+        if not prayer_settings.get('enabled', False):
+            self.log.info(f"Skipped {prayer} (disabled in config)")
+            self.record_skip('disabled', prayer)
+            return
+
+        elector = (self.parent or self).elector
+        if prayer in self.fired or (elector and self.fired_key(prayer, prayer_time) in elector.fired):
+            self.log.info(f"Skipped {prayer} (already fired today)")
+            return
+
+        # Only schedule if time is in the future
+        if prayer_time > now:
+            prepare_time = prayer_time - timedelta(seconds=prepare_seconds)
+            if prepare_seconds and prepare_time > now:
+                self.scheduler.add_job(
+                    self.prepare_azan,
+                    DateTrigger(run_date=prepare_time),
+                    args=[prayer],
+                    id=self.job_id('prepare', prayer),
+                    misfire_grace_time=grace
+                )
+            lead = self.config['azan'].get('trigger_lead_seconds', TRIGGER_LEAD_SECONDS)
+            self.scheduler.add_job(
+                self.fire_azan,
+                DateTrigger(run_date=max(now, prayer_time - timedelta(seconds=lead))),
+                args=[prayer, prayer_time],
+                id=self.job_id('azan', prayer),
+                misfire_grace_time=grace
+            )
+            self.log.info(f"Scheduled {prayer} at {prayer_time.strftime('%I:%M %p')}")
+            self.record('scheduled', prayer, prepare_seconds=prepare_seconds, trigger_lead_seconds=lead)
+        elif catch_up and (now - prayer_time).total_seconds() <= grace:
+            self.scheduler.add_job(
+                self.fire_azan,
+                DateTrigger(run_date=now),
+                args=[prayer, prayer_time],
+                id=self.job_id('azan', prayer),
+                misfire_grace_time=grace
             )
-            logger.info(f"Scheduled daily refresh at {tomorrow.strftime('%I:%M %p')}")
+            late = (now - prayer_time).total_seconds()
+            self.log.warning(f"Catching up {prayer}: its time passed {late:.0f}s ago and it hasn't been played")
+            self.record('scheduled', prayer, catch_up=True, late=late)
+        else:
+            self.log.info(f"Skipped {prayer} (time has passed)")
+            self.record_skip('skipped', prayer, reason='time has passed')
+
+    def reschedule_prayers(self, prayers, catch_up=False):
+        """Replace the jobs of just these prayers, leaving the others untouched"""
+        now = datetime.now(self.tz)
+        for prayer in prayers:
+            for kind in ('prepare', 'azan'):
+                if self.scheduler.get_job(self.job_id(kind, prayer)):
+                    self.scheduler.remove_job(self.job_id(kind, prayer))
+            self.prepared.pop(prayer, None)
+            if prayer in self.prayer_times:
+                self.schedule_prayer(prayer, now, catch_up)
+
+        # New jobs start out active; suspend them if we're paused
+        self.applied_pause = None
+        self.apply_pause_state()
+
+    def prayer_jobs(self):
+        """Scheduled prepare/play jobs (the ones a pause suspends)"""
+        return [job for job in self.scheduler.get_jobs()
+                if job.id.startswith(('azan_', 'prepare_')) and self.owns(job)]
+
+    def apply_pause_state(self, state=None):
+        """Suspend or restore prayer jobs to match the pause state"""
+        with self.pause_lock:
+            state = state or state_store.read_state()
+            paused = state.get('paused', False)
+            pause_until = state.get('pause_until') if paused else None
+
+            if pause_until and datetime.now() >= datetime.fromisoformat(pause_until):
+                # Expired while nobody was watching; the state listener re-applies
+                state_store.update_state(paused=False, pause_until=None)
+                paused, pause_until = False, None
+
+            if self.applied_pause == (paused, pause_until):
+                return
+            self.applied_pause = (paused, pause_until)
+
+            now = datetime.now().astimezone()
+            for job in self.prayer_jobs():
+                suspended = getattr(job, 'next_run_time', True) is None
+                if paused and not suspended:
+                    job.pause()
+                elif not paused and suspended:
+                    if job.trigger.run_date <= now:
+                        job.remove()
+                        self.log.info(f"Dropped {job.id} (time passed while paused)")
+                        if job.id.startswith('azan_'):
+                            PRAYERS_TOTAL.inc(outcome='paused')
+                            self.record('paused', job.args[0], reason='time passed while paused')
+                    else:
+                        job.resume()
+
+            if self.scheduler.get_job(self.job_id('pause_expiry')):
+                self.scheduler.remove_job(self.job_id('pause_expiry'))
+
+            if paused and pause_until:
+                self.scheduler.add_job(
+                    self.expire_pause,
+                    DateTrigger(run_date=datetime.fromisoformat(pause_until)),
+                    id=self.job_id('pause_expiry')
+                )
+                self.log.info(f"Paused until {datetime.fromisoformat(pause_until).strftime('%I:%M %p')}")
+            elif paused:
+                self.log.info("Paused indefinitely")
+            else:
+                self.log.info("Running (prayer jobs active)")
+
+    def expire_pause(self):
+        """Auto-resume when a timed pause runs out"""
+        self.log.info("Pause expired, resuming")
+        state = state_store.update_state(paused=False, pause_until=None)
+        self.apply_pause_state(state)
+
+    def status(self):
+        """Live scheduler status for the control channel"""
+        state = state_store.read_state()
+        now = datetime.now().astimezone()
+
+        scheduled = []
+        # Play jobs start a little early; their second argument is the prayer time
+        jobs = [(job.args[1].astimezone(), job) for job in self.scheduler.get_jobs() if job.id.startswith('azan_')]
+        for prayer_time, job in sorted(jobs, key=lambda item: item[0]):
+            if prayer_time > now:
+                prayer, _, site = job.id[len('azan_'):].partition('@')
+                entry = {
+                    'prayer': prayer,
+                    'time': prayer_time.isoformat(),
+                    'suspended': getattr(job, 'next_run_time', True) is None
+                }
+                if site:
+                    entry['site'] = site
+                scheduled.append(entry)
+
+        status = {
+            'source': 'scheduler',
+            'paused': state.get('paused', False),
+            'pause_until': state.get('pause_until'),
+            'next_prayer': scheduled[0]['prayer'] if scheduled else None,
+            'next_prayer_time': scheduled[0]['time'] if scheduled else None,
+            'scheduled': scheduled
+        }
+        if self.elector:
+            status['ha'] = {'node': self.elector.node_id, 'role': 'leader' if self.elector.is_leader else 'standby',
+                            'leader': self.elector.holder}
+        return status
+
+    def handle_command(self, command):
+        """Handle a control channel command and return the resulting status"""
+        action = command.get('action')
+
+        if action == 'pause':
+            minutes = command.get('minutes')
+            if minutes is not None and minutes <= 0:
+                raise ValueError("Pause minutes must be a positive number")
+            pause_until = (datetime.now() + timedelta(minutes=minutes)).isoformat() if minutes else None
+            state = state_store.update_state(paused=True, pause_until=pause_until)
+            for site in self.sites:
+                site.apply_pause_state(state)
+        elif action == 'resume':
+            state = state_store.update_state(paused=False, pause_until=None)
+            for site in self.sites:
+                site.apply_pause_state(state)
+        elif action != 'status':
+            raise ValueError(f"Unknown action: {action}")
+
+        return self.status()
+
+    def start_control_channel(self):
+        """Listen for pause/resume/status commands and watch the state file"""
+        # Changes written by other processes (e.g. the web container) apply within a second
+        for site in self.sites:
+            state_store.add_listener(site.apply_pause_state)
+        state_store.start_watcher()
+
+        if not self.config.get('control', {}).get('enabled', True):
+            return
+        try:
+            self.control_server = control_channel.ControlServer(
+                self.handle_command, control_channel.configured_address(self.config))
+            self.control_server.start()
+        except OSError as e:
+            self.log.warning(f"Control channel unavailable: {e}")
+
+    def apply_config(self, config):
+        """Switch to a changed config, redoing only what the change affects
+
+        Speakers are reconnected only if the speaker selection changed, prayer
+        times are reloaded only if the location changed, and otherwise only
+        the jobs of prayers whose schedule changed are replaced. A config whose
+        prayers don't compile is rejected and the running one kept. Returns
+        False if rejected.
+        """
+        changes = config_diff(self.config, config)
+        if not changes:
+            return True
+        sections = {path.split('.')[0] for path, _, _ in changes}
+        previous = (self.config, self.speakers, self.sonos_device, self.plans, self.tz)
+        old_config, old_plans = self.config, self.plans
 
+        self.config = config
+        try:
+            timezone = config.get('location', {}).get('timezone')
+            self.tz = ZoneInfo(timezone) if timezone and ZoneInfo else None
+
+            if 'sonos' in sections:
+                if speaker_identity(old_config) != speaker_identity(config):
+                    if not self.discover_sonos():
+                        raise ValueError("speakers could not be connected")
+                else:
+                    # Same speakers: keep the connections, update copies so a rejection can roll back
+                    self.speakers = [dict(speaker) for speaker in self.speakers]
+                    self.update_volumes()
+
+            if sections & {'sonos', 'azan', 'audio'} and not self.compile_plans():
+                raise ValueError("invalid prayer config")
         except Exception as e:
-            logger.error(f"Failed to schedule prayers: {e}")
+            self.config, self.speakers, self.sonos_device, self.plans, self.tz = previous
+            self.log.error(f"Config change rejected, keeping the running config: {e}")
+            return False
+
+        for path, before, after in changes:
+            self.log.info(f"Config changed: {path}: {before!r} -> {after!r}")
 
-    def refresh_schedule(self):
-        """Refresh prayer times and reschedule"""
-        logger.info("Refreshing prayer schedule...")
+        if 'location' in sections:
+            self.refresh_schedule()
+            return True
+
+        # Pre-warmed speakers hold the old track or volume for changed plans
+        for prayer, plan in self.plans.items():
+            if old_plans.get(prayer) != plan:
+                self.prepared.pop(prayer, None)
+
+        old_azan, new_azan = old_config['azan'], config['azan']
+        if any(old_azan.get(key) != new_azan.get(key)
+               for key in ('prepare_seconds', 'trigger_lead_seconds', 'misfire_grace_seconds')):
+            affected = list(self.prayer_times)
+        else:
+            affected = [prayer for prayer in self.prayer_times
+                        if old_azan['prayers'].get(prayer, {}).get('enabled', False) !=
+                        new_azan['prayers'].get(prayer, {}).get('enabled', False)]
+        if affected:
+            self.reschedule_prayers(affected)
+        return True
+
+    def reload_config(self):
+        """Re-read config.json and apply what changed to every site"""
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            self.log.error(f"Ignoring unreadable {self.config_file}: {e}")
+            return
+        if config == self.config:
+            return
+
+        changes = config_diff(self.config, config)
+        for path, _, _ in changes:
+            if path.split('.')[0] in RESTART_SECTIONS or path == 'sonos.max_workers':
+                self.log.warning(f"Config changed: {path} takes effect after a restart")
+
+        if not self.config.get('sites') and not config.get('sites'):
+            self.apply_config(config)
+        else:
+            names = [site['name'] for site in config.get('sites') or []]
+            if names != [site.name for site in self.sites]:
+                self.log.warning("Adding, removing or reordering sites takes effect after a restart")
+            self.config = config
+            entries = {site['name']: site for site in config.get('sites') or []}
+            for site in self.sites:
+                if site.name in entries:
+                    site.apply_config(site_config(config, entries[site.name]))
+
+        self.start_audio_server()
+        self.configure_speaker_revalidation()
+        self.configure_history()
+
+    def start_config_watcher(self):
+        """Poll config.json on a daemon thread and apply changes as they are saved"""
+        def signature():
+            try:
+                st = os.stat(self.config_file)
+            except FileNotFoundError:
+                return None
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        def watch():
+            seen = signature()
+            stop = threading.Event()
+            while not stop.wait(CONFIG_CHECK_SECONDS):
+                current = signature()
+                if current is None or current == seen:
+                    continue
+                seen = current
+                try:
+                    self.reload_config()
+                except Exception as e:
+                    self.log.error(f"Config reload failed: {e}")
+
+        threading.Thread(target=watch, name='config-watcher', daemon=True).start()
+
+    def start_speaker_revalidation(self):
+        """Rediscover speakers in the background so IP changes are followed"""
+        for site in self.sites:
+            speaker_cache.add_listener(site.update_speakers)
+        self.configure_speaker_revalidation()
+
+    def configure_speaker_revalidation(self):
+        """Apply sonos.revalidate_seconds and scan_networks to the revalidator (also on reload)"""
+        interval = self.config.get('sonos', {}).get('revalidate_seconds', REVALIDATE_SECONDS)
+        networks = []
+        for site in self.sites:
+            networks.extend(network for network in speaker_cache.configured_networks(site.config)
+                            if network not in networks)
+        speaker_cache.start_revalidator(interval, networks)
+
+    def refresh_schedule(self, attempt=0):
+        """Refresh prayer times and reschedule, retrying with backoff on failure"""
+        self.log.info("Refreshing prayer schedule...")
         if self.fetch_prayer_times():
             self.schedule_prayers()
+            return
 
-    def run(self):
-        """Main run loop"""
-        logger.info("Starting Azan Scheduler...")
+        # Without this the day (and every day after it) would have no jobs
+        delay = REFRESH_RETRY_DELAYS[min(attempt, len(REFRESH_RETRY_DELAYS) - 1)]
+        self.scheduler.add_job(
+            self.refresh_schedule,
+            DateTrigger(run_date=datetime.now() + timedelta(seconds=delay)),
+            args=[attempt + 1],
+            id=self.job_id('refresh_retry'),
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+        self.log.warning(f"Prayer time refresh failed; retrying in {delay}s (attempt {attempt + 1})")
+
+    def record_lag(self, event):
+        """Record how late a job started relative to its scheduled run time"""
+        now = datetime.now().astimezone()
+        for run_time in event.scheduled_run_times:
+            SCHEDULER_LAG_SECONDS.observe(max(0.0, (now - run_time).total_seconds()),
+                                          job=event.job_id.split('_')[0])
 
-        # Connect to Sonos
-        if not self.discover_sonos():
-            logger.error("Cannot start without Sonos connection")
+    def record_missed(self, event):
+        """Log jobs APScheduler dropped for starting later than the misfire grace time"""
+        lateness = (datetime.now().astimezone() - event.scheduled_run_time).total_seconds()
+        job_name, _, site_name = event.job_id.partition('@')
+        site = next((site for site in self.sites if (site.name or '') == site_name), self)
+        site.log.error(f"Missed {job_name}: started {lateness:.0f}s late, beyond the misfire grace time")
+        if job_name.startswith('azan_'):
+            PRAYERS_TOTAL.inc(outcome='missed')
+            if site in self.sites:
+                site.record('missed', job_name[len('azan_'):], lateness=lateness)
+
+    def start_metrics_server(self):
+        """Serve /metrics for Prometheus if metrics.port is set"""
+        port = self.config.get('metrics', {}).get('port', 9101)
+        if not port:
             return
+        try:
+            metrics.start_http_server(port)
+        except OSError as e:
+            self.log.warning(f"Metrics server unavailable: {e}")
 
-        # Fetch initial prayer times
-        if not self.fetch_prayer_times():
-            logger.error("Cannot start without prayer times")
+    def start_web_server(self):
+        """Serve the web control page from this process if web.embedded is set
+
+        The page then shares the scheduler's state, speaker connections and
+        prayer times cache instead of running as a second Python process.
+        """
+        web_config = self.config.get('web', {})
+        if not web_config.get('embedded'):
             return
+        import web_control
+        web_control.attach_scheduler(self)
+        port = web_config.get('port', 8080)
+        try:
+            import uvicorn
+            import web_asgi
+        except ImportError:
+            self.log.warning("uvicorn is not installed; serving the web page with Flask's built-in server")
+            serve = functools.partial(web_control.app.run, host='0.0.0.0', port=port, threaded=True)
+        else:
+            # Off the main thread uvicorn leaves signal handling to the scheduler
+            serve = uvicorn.Server(uvicorn.Config(web_asgi.app, host='0.0.0.0', port=port, log_level='warning')).run
+        threading.Thread(target=serve, name='web', daemon=True).start()
+        self.log.info(f"Web control page on port {port}")
 
-        # Schedule prayers
-        self.schedule_prayers()
+    def start_audio_server(self):
+        """Serve local Azan files to the speakers if any prayer uses one
+
+        Also called on reload: a server on another port or directory than
+        audio.* now says is replaced, and one no longer needed is stopped.
+        """
+        uses_files = any(prayer.get('file') for site in self.sites
+                         for prayer in site.config['azan']['prayers'].values())
+        port = self.config.get('audio', {}).get('port', audio_server.DEFAULT_PORT)
+        wanted = (self.audio_directory(), port) if uses_files and port else None
+        if self.audio_server:
+            if wanted == (self.audio_server.directory, self.audio_server.server_address[1]):
+                return
+            self.audio_server.shutdown()
+            self.audio_server.server_close()
+            self.audio_server = None
+            self.log.info("Stopped the audio server")
+        if not wanted:
+            return
+        try:
+            self.audio_server = audio_server.start_http_server(*wanted)
+        except OSError as e:
+            self.log.warning(f"Audio server unavailable: {e}")
+
+    def start_leader_election(self):
+        """Compete for the HA lease if ha.lease is set; only the leader plays"""
+        ha_config = self.config.get('ha', {})
+        if not ha_config.get('lease'):
+            return
+        self.elector = leader_election.LeaderElector(
+            leader_election.open_lease(ha_config['lease']),
+            ha_config.get('node_id') or socket.gethostname(),
+            ttl=ha_config.get('ttl_seconds', leader_election.DEFAULT_TTL),
+            on_elected=self.took_over)
+        self.elector.start()
+
+    def took_over(self, fired):
+        """Became leader: catch up any prayer the previous leader didn't get to play"""
+        if not self.scheduler.running:
+            return  # Still starting; run() schedules with catch-up itself
+        for site in self.sites:
+            # Only the prayer jobs: a pending refresh retry or the daily refresh must survive
+            if site.prayer_times:
+                site.reschedule_prayers(list(site.prayer_times), catch_up=True)
+
+    def configure_history(self):
+        """Apply history.retention_days to the playback history store"""
+        playback_history.configure(
+            self.config.get('history', {}).get('retention_days', playback_history.DEFAULT_RETENTION_DAYS))
+
+    def run(self):
+        """Main run loop"""
+        self.log.info("Starting Azan Scheduler...")
+        self.configure_history()
+        self.start_leader_election()
+
+        if self.config.get('sites'):
+            self.log.info(f"Serving {len(self.sites)} sites: {', '.join(site.name for site in self.sites)}")
+
+        started = []
+        for site in self.sites:
+            # Connect to Sonos
+            if not site.discover_sonos():
+                site.log.error("Cannot start without Sonos connection")
+                continue
+
+            # Validate the prayer config once, not when each prayer fires
+            if not site.compile_plans():
+                site.log.error("Cannot start with invalid prayer config")
+                continue
+
+            # Resume today's stored schedule if there is one, else fetch prayer times
+            restored = site.restore_schedule()
+            if not restored and not site.fetch_prayer_times():
+                site.log.error("Cannot start without prayer times")
+                continue
+
+            # Schedule prayers, playing any that passed just now while we were down
+            site.schedule_prayers(catch_up=True)
+            if restored:
+                # Check the restored times against the source once the scheduler is running
+                self.scheduler.add_job(site.revalidate_schedule, DateTrigger(run_date=datetime.now()),
+                                       id=site.job_id('revalidate_schedule'), misfire_grace_time=None)
+            started.append(site)
+
+        if not started:
+            return
+        self.start_control_channel()
+        self.start_metrics_server()
+        self.start_web_server()
+        self.start_audio_server()
+        self.start_speaker_revalidation()
+        self.start_config_watcher()
 
         # Start scheduler
-        logger.info("Scheduler started. Press Ctrl+C to exit.")
+        self.log.info("Scheduler started. Press Ctrl+C to exit.")
         try:
             self.scheduler.start()
         except (KeyboardInterrupt, SystemExit):
-            logger.info("Scheduler stopped.")
+            self.log.info("Scheduler stopped.")
+        finally:
+            if self.elector:
+                self.elector.stop()
+            playback_history.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark
+Runs the real AzanScheduler against local fake Sonos speakers and a fake
+Aladhan API (see fake_services.py) and reports how long it takes from a
+prayer's scheduled time until every speaker has received Play, along with
+the cold/warm prayer time fetch and per-stage timings.
+
+Usage:
+    python3 bench_latency.py [--speakers N] [--iterations N] [--delay S]
+                             [--jitter S] [--error-rate R] [--prepare-seconds S]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Keep the cache and state file out of the real data directory
+_data_dir = tempfile.mkdtemp(prefix='azan-bench-')
+os.environ['AZAN_DATA_DIR'] = _data_dir
+
+import logging  # noqa: E402
+
+import fake_services  # noqa: E402
+import metrics  # noqa: E402
+import prayer_cache  # noqa: E402
+
+SPOTIFY_URI = 'spotify:track:4uLU6hMCjMI75M1A2tKUQC'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, values):
+    if not values:
+        print(f"  {label:<28} no samples")
+        return
+    ms = [value * 1000 for value in values]
+    print(f"  {label:<28} n={len(ms):<4} min={min(ms):7.1f}  median={statistics.median(ms):7.1f}  "
+          f"p90={percentile(ms, 0.9):7.1f}  p99={percentile(ms, 0.99):7.1f}  max={max(ms):7.1f} ms")
+
+
+def stage_means():
+    """Mean seconds per playback stage from the shared histogram"""
+    with metrics.PLAYBACK_STAGE_SECONDS.lock:
+        series = {key[0]: (value['sum'], sum(value['counts']))
+                  for key, value in metrics.PLAYBACK_STAGE_SECONDS.values.items()}
+    return {stage: total / count for stage, (total, count) in series.items() if count}
+
+
+def write_config(path, speakers, aladhan, prepare_seconds):
+    config = {
+        'location': {'city': 'Huddinge', 'country': 'Sweden', 'method': 3},
+        'sonos': {
+            'speakers': [{'name': speaker.name, 'ip': speaker.ip} for speaker in speakers],
+            'volume': 30
+        },
+        'azan': {
+            'prepare_seconds': prepare_seconds,
+            'prayers': {'Fajr': {'enabled': True, 'spotify_uri': SPOTIFY_URI}}
+        },
+        'control': {'enabled': False},
+        'metrics': {'port': 0}
+    }
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure trigger-to-Play latency against fake services')
+    parser.add_argument('--speakers', type=int, default=3, help='Number of fake speakers (default: 3)')
+    parser.add_argument('--iterations', type=int, default=10, help='Prayers to trigger (default: 10)')
+    parser.add_argument('--delay', type=float, default=0.02, help='Per-request speaker delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Extra random speaker delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of speaker requests that fail')
+    parser.add_argument('--api-delay', type=float, default=0.2, help='Fake Aladhan response delay in seconds')
+    parser.add_argument('--prepare-seconds', type=float, default=2,
+                        help='Pre-warm lead time; 0 loads the Azan at prayer time (default: 2)')
+    parser.add_argument('--verbose', action='store_true', help='Show scheduler logging')
+    args = parser.parse_args()
+
+    speakers = []
+    for index in range(args.speakers):
+        faults = fake_services.Faults(args.delay, args.jitter, args.error_rate, seed=index)
+        speakers.append(fake_services.FakeSonos(f"127.0.0.{index + 2}", f"Room {index + 1}",
+                                                faults=faults).start())
+    aladhan = fake_services.FakeAladhan(faults=fake_services.Faults(args.api_delay)).start()
+    prayer_cache.ALADHAN_URL = aladhan.url
+
+    config_file = os.path.join(_data_dir, 'config.json')
+    write_config(config_file, speakers, aladhan, args.prepare_seconds)
+
+    from azan_scheduler import AzanScheduler
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    scheduler = AzanScheduler(config_file)
+
+    print(f"Fake speakers: {args.speakers} (delay {args.delay * 1000:.0f}"
+          f"+{args.jitter * 1000:.0f} ms, error rate {args.error_rate:.0%}); "
+          f"fake Aladhan delay {args.api_delay * 1000:.0f} ms")
+
+    started = time.perf_counter()
+    if not scheduler.discover_sonos():
+        sys.exit("Speaker connection failed")
+    discover = time.perf_counter() - started
+    if not scheduler.compile_plans():
+        sys.exit("Invalid prayer config")
+
+    started = time.perf_counter()
+    scheduler.fetch_prayer_times()
+    fetch_cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scheduler.fetch_prayer_times()
+    fetch_warm = time.perf_counter() - started
+
+    threading.Thread(target=scheduler.scheduler.start, daemon=True).start()
+
+    # Note how many speakers each prepare step actually loaded
+    loaded_counts = []
+    prepare_azan = scheduler.prepare_azan
+
+    def prepare_and_count(prayer):
+        prepare_azan(prayer)
+        loaded_counts.append(len(scheduler.prepared.get(prayer, {}).get('loaded', ())))
+    scheduler.prepare_azan = prepare_and_count
+
+    onsets, skews, missed, not_prewarmed = [], [], 0, 0
+    lead = args.prepare_seconds + 0.5
+    for _ in range(args.iterations):
+        # The last Azan is still "playing"; a busy speaker would make prepare defer the load to T-0
+        for speaker in speakers:
+            speaker.state = 'STOPPED'
+        loaded_counts.clear()
+        marks = [len(speaker.play_times) for speaker in speakers]
+        trigger = datetime.now() + timedelta(seconds=lead)
+        scheduler.prayer_times = {'Fajr': trigger}
+        scheduler.fired.clear()
+        scheduler.schedule_prayers()
+
+        deadline = time.time() + lead + 15
+        while time.time() < deadline:
+            if all(len(speaker.play_times) > mark for speaker, mark in zip(speakers, marks)):
+                break
+            time.sleep(0.005)
+
+        plays = [speaker.play_times[mark] for speaker, mark in zip(speakers, marks)
+                 if len(speaker.play_times) > mark]
+        missed += len(speakers) - len(plays)
+        if args.prepare_seconds and loaded_counts != [len(speakers)]:
+            # Some speaker was loaded at T-0, so this isn't a pre-warmed sample
+            not_prewarmed += 1
+        elif plays:
+            onsets.append(max(plays) - trigger.timestamp())
+            skews.append(max(plays) - min(plays))
+        time.sleep(0.2)
+
+    scheduler.scheduler.shutdown(wait=False)
+
+    print("\nPrayer times:")
+    summarize('discover (connect speakers)', [discover])
+    summarize('fetch (cold, fake Aladhan)', [fetch_cold])
+    summarize('fetch (warm, cache)', [fetch_warm])
+
+    mode = f"pre-warmed {args.prepare_seconds:g}s" if args.prepare_seconds else 'cold'
+    print(f"\nPlayback ({mode}):")
+    summarize('trigger -> last Play', onsets)
+    summarize('skew between speakers', skews)
+    if missed:
+        print(f"  speakers that never played: {missed}")
+    if not_prewarmed:
+        print(f"  runs left out (not loaded on every speaker in advance): {not_prewarmed}")
+
+    print("\nMean per stage:")
+    for stage, seconds in sorted(stage_means().items()):
+        print(f"  {stage:<28} {seconds * 1000:7.1f} ms")
+
+    for speaker in speakers:
+        speaker.stop()
+    aladhan.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the two deployment layouts
+Starts the scheduler and web page as two processes (the azan-scheduler and
+azan-web containers) and then as one process with web.embedded, against
+local fake Sonos speakers and a fake Aladhan API (see fake_services.py),
+exercises the web API and reports each layout's resident memory (RSS) and
+proportional set size (PSS, which splits shared pages fairly). Linux only.
+
+Usage:
+    python3 bench_memory.py [--speakers N] [--requests N]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+# Keep the cache and state file out of the real data directory
+_data_dir = tempfile.mkdtemp(prefix='azan-bench-')
+os.environ['AZAN_DATA_DIR'] = _data_dir
+
+import fake_services  # noqa: E402
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SPOTIFY_URI = 'spotify:track:4uLU6hMCjMI75M1A2tKUQC'
+
+RUN_SCHEDULER = "import sys; from azan_scheduler import AzanScheduler; AzanScheduler(sys.argv[1]).run()"
+RUN_WEB = ("import sys, uvicorn, web_control, web_asgi; web_control.CONFIG_FILE = sys.argv[1]; "
+           "uvicorn.run(web_asgi.app, host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(path, speakers, embedded, web_port, control_port):
+    config = {
+        'location': {'city': 'Huddinge', 'country': 'Sweden', 'method': 3},
+        'sonos': {
+            'speakers': [{'name': speaker.name, 'ip': speaker.ip} for speaker in speakers],
+            'volume': 30,
+            'revalidate_seconds': 0
+        },
+        'azan': {'prayers': {'Fajr': {'enabled': True, 'spotify_uri': SPOTIFY_URI}}},
+        'control': {'port': control_port},
+        'metrics': {'port': 0},
+        'web': {'port': web_port, 'embedded': embedded}
+    }
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB"""
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        pss = next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+    return rss, pss
+
+
+def exercise(port, count):
+    """Wait for the page to answer, then send count rounds of typical requests"""
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while True:
+        try:
+            if requests.get(f"{base}/api/status", timeout=1).ok:
+                break
+        except requests.RequestException:
+            pass
+        if time.time() > deadline:
+            sys.exit("Web page did not come up")
+        time.sleep(0.1)
+
+    year = time.strftime('%Y')
+    for _ in range(count):
+        for path in ('/', '/api/status', '/api/prayer-times', '/api/history',
+                     f'/api/schedule?from={year}-01-01&to={year}-12-31&format=csv'):
+            requests.get(base + path, timeout=10)
+    requests.post(f"{base}/api/pause?minutes=5", timeout=5)
+    requests.post(f"{base}/api/resume", timeout=5)
+
+
+def run_layout(label, commands, web_port, requests_count):
+    processes = []
+    for role, command in commands:
+        processes.append((role, subprocess.Popen([sys.executable, '-c', *command], cwd=SCRIPT_DIR,
+                                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)))
+    try:
+        exercise(web_port, requests_count)
+        time.sleep(1)
+        rows = [(role, *memory_kb(process.pid)) for role, process in processes]
+    finally:
+        for _, process in processes:
+            process.terminate()
+        for _, process in processes:
+            process.wait(timeout=10)
+
+    print(f"\n{label}:")
+    for role, rss, pss in rows:
+        print(f"  {role:<22} RSS {rss / 1024:7.1f} MiB   PSS {pss / 1024:7.1f} MiB")
+    total_rss = sum(row[1] for row in rows)
+    total_pss = sum(row[2] for row in rows)
+    print(f"  {'total':<22} RSS {total_rss / 1024:7.1f} MiB   PSS {total_pss / 1024:7.1f} MiB")
+    return total_rss, total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of the two-process and combined layouts')
+    parser.add_argument('--speakers', type=int, default=3, help='Number of fake speakers (default: 3)')
+    parser.add_argument('--requests', type=int, default=20, help='Rounds of web requests before measuring')
+    args = parser.parse_args()
+
+    speakers = [fake_services.FakeSonos(f"127.0.0.{index + 2}", f"Room {index + 1}").start()
+                for index in range(args.speakers)]
+    aladhan = fake_services.FakeAladhan().start()
+    os.environ['ALADHAN_URL'] = aladhan.url
+
+    results = {}
+    for label, embedded in (('Two processes (scheduler + web)', False), ('One process (web.embedded)', True)):
+        web_port, control_port = free_port(), free_port()
+        config_file = os.path.join(_data_dir, 'config.json')
+        write_config(config_file, speakers, embedded, web_port, control_port)
+        commands = [('scheduler + web' if embedded else 'scheduler', [RUN_SCHEDULER, config_file])]
+        if not embedded:
+            commands.append(('web', [RUN_WEB, config_file, str(web_port)]))
+        results[embedded] = run_layout(label, commands, web_port, args.requests)
+
+    (separate_rss, separate_pss), (combined_rss, combined_pss) = results[False], results[True]
+    print(f"\nSaving: RSS {(separate_rss - combined_rss) / 1024:.1f} MiB ({1 - combined_rss / separate_rss:.0%}), "
+          f"PSS {(separate_pss - combined_pss) / 1024:.1f} MiB ({1 - combined_pss / separate_pss:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,48 @@
 #!/usr/bin/env python3
 """Control Azan Scheduler - Pause, Resume, or Stop"""
 
-import json
-import os
 import sys
 from datetime import datetime, timedelta
 
-# Use script directory for state file
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-STATE_FILE = os.path.join(SCRIPT_DIR, 'scheduler_state.json')
+from control_channel import SchedulerUnavailable, send_command
+from state_store import read_state, update_state
 
-def read_state():
-    """Read current scheduler state"""
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    return {"paused": False, "pause_until": None}
-
-def write_state(state):
-    """Write scheduler state"""
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=2)
+def send_to_scheduler(action, **params):
+    """Send a command to the running scheduler; None if it isn't reachable"""
+    try:
+        return send_command(action, **params)
+    except SchedulerUnavailable:
+        return None
 
 def pause_scheduler(duration_minutes=None):
     """Pause the scheduler"""
-    state = read_state()
-    state['paused'] = True
+    pause_until = datetime.now() + timedelta(minutes=duration_minutes) if duration_minutes else None
+
+    # The scheduler suspends its jobs immediately; otherwise it picks up the file change
+    if send_to_scheduler('pause', minutes=duration_minutes) is None:
+        update_state(paused=True, pause_until=pause_until.isoformat() if pause_until else None)
 
-    if duration_minutes:
-        pause_until = datetime.now() + timedelta(minutes=duration_minutes)
-        state['pause_until'] = pause_until.isoformat()
+    if pause_until:
         print(f"✓ Azan paused until {pause_until.strftime('%I:%M %p')}")
     else:
-        state['pause_until'] = None
         print("✓ Azan paused indefinitely")
 
-    write_state(state)
-
 def resume_scheduler():
     """Resume the scheduler"""
-    state = read_state()
-    state['paused'] = False
-    state['pause_until'] = None
-    write_state(state)
+    if send_to_scheduler('resume') is None:
+        update_state(paused=False, pause_until=None)
     print("✓ Azan resumed")
 
 def check_status():
     """Check current status"""
-    state = read_state()
+    status = send_to_scheduler('status')
+    if status is None:
+        print("(Scheduler not reachable - showing saved state)")
+        status = read_state()
 
-    if state['paused']:
-        if state['pause_until']:
-            pause_until = datetime.fromisoformat(state['pause_until'])
+    if status.get('paused'):
+        if status.get('pause_until'):
+            pause_until = datetime.fromisoformat(status['pause_until'])
             if datetime.now() < pause_until:
                 print(f"Status: PAUSED until {pause_until.strftime('%I:%M %p')}")
             else:
@@ -61,6 +52,10 @@ def check_status():
     else:
         print("Status: RUNNING")
 
+    if status.get('next_prayer'):
+        next_time = datetime.fromisoformat(status['next_prayer_time'])
+        print(f"Next Azan: {status['next_prayer']} at {next_time.strftime('%I:%M %p')}")
+
 def stop_current_playback():
     """Stop any currently playing Azan"""
     try:
@@ -81,6 +76,8 @@ if __name__ == "__main__":
                         help='Pause duration in minutes (for pause action)')
 
     args = parser.parse_args()
+    if args.minutes is not None and args.minutes <= 0:
+        parser.error('--minutes must be a positive number')
 
     if args.action == 'pause':
         pause_scheduler(args.minutes)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Local control channel for the running Azan scheduler
+The scheduler listens on a localhost TCP port (shared by the containers in
+host network mode); control_azan.py and web_control.py send one JSON command
+per connection and get the scheduler's live answer back.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(SCRIPT_DIR, 'config.json')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+class SchedulerUnavailable(Exception):
+    """The scheduler's control channel could not be reached"""
+
+
+def configured_address(config=None):
+    """(host, port) from config['control'], AZAN_CONTROL_PORT or the defaults"""
+    if config is None:
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+        except Exception:
+            config = {}
+
+    control = config.get('control', {})
+    port = int(os.environ.get('AZAN_CONTROL_PORT', control.get('port', DEFAULT_PORT)))
+    return control.get('host', DEFAULT_HOST), port
+
+
+def send_command(action, timeout=1.0, address=None, **params):
+    """Send a command to the running scheduler and return its JSON reply"""
+    host, port = address or configured_address()
+    command = dict(params, action=action)
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(json.dumps(command).encode() + b'\n')
+            reply = sock.makefile('rb').readline()
+    except OSError as e:
+        raise SchedulerUnavailable(f"Scheduler not reachable on {host}:{port}: {e}")
+
+    if not reply:
+        raise SchedulerUnavailable("Scheduler closed the connection without replying")
+
+    result = json.loads(reply)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            command = json.loads(self.rfile.readline())
+            result = self.server.dispatch(command)
+        except Exception as e:
+            result = {'error': str(e)}
+        self.wfile.write(json.dumps(result).encode() + b'\n')
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    """Serves control commands by passing them to dispatch(command) -> dict"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, dispatch, address=None):
+        super().__init__(address or configured_address(), _Handler)
+        self.dispatch = dispatch
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='control-channel', daemon=True)
+        thread.start()
+        host, port = self.server_address
+        logger.info(f"Control channel listening on {host}:{port}")
+        return thread
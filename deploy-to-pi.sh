@@ -31,7 +31,20 @@ tar -czf azan-pi-deployment.tar.gz \
     requirements.txt \
     azan_scheduler.py \
     web_control.py \
+    web_asgi.py \
     control_azan.py \
+    prayer_calc.py \
+    prayer_cache.py \
+    state_store.py \
+    control_channel.py \
+    metrics.py \
+    http_client.py \
+    speaker_cache.py \
+    audio_server.py \
+    prayer_schedule.py \
+    playback_history.py \
+    schedule_store.py \
+    leader_election.py \
     Dockerfile \
     docker-compose.yml \
     .dockerignore
@@ -48,7 +61,7 @@ echo ""
 echo "🔧 Setting up on Pi (this will take a few minutes)..."
 ssh pi@$PI_IP << 'ENDSSH'
     # Create directory
-    mkdir -p ~/azan-scheduler
+    mkdir -p ~/azan-scheduler/data
     cd ~/azan-scheduler
 
     # Extract
@@ -1,22 +1,35 @@
 #!/usr/bin/env python3
-"""Discover Sonos speakers on your network"""
+"""Discover Sonos speakers on your network (and refresh speaker_cache.json)
 
-import soco
+Usage:
+    python3 discover_sonos.py                    # Multicast, then sonos.scan_networks from config.json
+    python3 discover_sonos.py 192.168.1.0/24     # Multicast, then scan this subnet
+"""
+
+import json
+import os
+import sys
+
+import speaker_cache
+
+networks = sys.argv[1:]
+if not networks and os.path.exists('config.json'):
+    with open('config.json', 'r') as f:
+        networks = speaker_cache.configured_networks(json.load(f))
 
 print("Discovering Sonos speakers...")
-speakers = soco.discover()
+speakers = speaker_cache.discover(networks=networks)
 
 if speakers:
     print(f"\nFound {len(speakers)} Sonos speaker(s):\n")
-    for speaker in speakers:
-        print(f"  Name: {speaker.player_name}")
-        print(f"  IP:   {speaker.ip_address}")
-        try:
-            info = speaker.get_speaker_info()
-            print(f"  Model: {info.get('model_name', 'Unknown')}")
-        except:
-            print(f"  Model: Unknown")
+    for speaker in speakers.values():
+        print(f"  Name: {speaker['name']}")
+        print(f"  IP:   {speaker['ip']}")
+        print(f"  Model: {speaker['model'] or 'Unknown'}")
+        print(f"  UID:  {speaker['uid']}")
         print()
+    print(f"Saved to {speaker_cache.CACHE_FILE}")
 else:
     print("No Sonos speakers found.")
-    print("Make sure your Mac and Sonos are on the same WiFi network.")
+    print("Make sure your Mac and Sonos are on the same WiFi network,")
+    print("or pass your subnet (e.g. 192.168.1.0/24) to scan it directly.")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for a Sonos speaker and the Aladhan API
+Used by the benchmarks to exercise the real scheduler code paths without a
+network. Both servers can inject latency and errors.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import prayer_calc
+
+SOAP_ENVELOPE = (
+    '<?xml version="1.0"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+    's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<s:Body>{body}</s:Body></s:Envelope>'
+)
+
+# Service description listing the argument-less actions soco looks up before calling
+SCPD = (
+    '<?xml version="1.0"?><scpd xmlns="urn:schemas-upnp-org:service-1-0"><actionList>'
+    + ''.join(f'<action><name>{name}</name><argumentList/></action>'
+              for name in ('GetHouseholdID', 'GetZoneGroupState', 'GetZoneAttributes'))
+    + '</actionList><serviceStateTable/></scpd>'
+)
+
+SOAP_FAULT = (
+    '<s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring>'
+    '<detail><UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+    '<errorCode>701</errorCode></UPnPError></detail></s:Fault>'
+)
+
+
+class Faults:
+    """Injected latency (seconds, uniform in [delay, delay + jitter]) and error rate (0-1)"""
+
+    def __init__(self, delay=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def apply(self):
+        """Sleep for the injected delay; returns True if this request should fail"""
+        with self.lock:
+            pause = self.delay + self.random.uniform(0, self.jitter) if (self.delay or self.jitter) else 0
+            fail = self.random.random() < self.error_rate
+        if pause:
+            time.sleep(pause)
+        return fail
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, content_type):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _SonosHandler(_QuietHandler):
+    def do_GET(self):
+        speaker = self.server.speaker
+        if self.path == '/xml/device_description.xml':
+            self.reply(200, speaker.device_description(), 'text/xml')
+        elif self.path.startswith('/xml/'):
+            self.reply(200, SCPD, 'text/xml')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        speaker = self.server.speaker
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode()
+        soap_action = self.headers.get('SOAPACTION', '').strip('"')
+        service, _, action = soap_action.partition('#')
+
+        received = time.time()
+        if speaker.faults.apply():
+            self.reply(500, SOAP_ENVELOPE.format(body=SOAP_FAULT), 'text/xml')
+            return
+
+        out_args = speaker.handle(action, body, received)
+        response = ''.join(f'<{name}>{escape(str(value))}</{name}>' for name, value in out_args.items())
+        self.reply(200, SOAP_ENVELOPE.format(
+            body=f'<u:{action}Response xmlns:u="{service}">{response}</u:{action}Response>'), 'text/xml')
+
+
+class FakeSonos:
+    """A single fake Sonos player answering UPnP/SOAP on ip:port"""
+
+    def __init__(self, ip='127.0.0.1', name='Living Room', port=1400, faults=None, uid=None):
+        self.ip = ip
+        self.name = name
+        self.port = port
+        self.faults = faults or Faults()
+        self.uid = uid or f"RINCON_FAKE{abs(hash((ip, port))) % 10 ** 12:012d}{port}"
+        self.state = 'STOPPED'
+        self.volume = 20
+        self.uri = ''
+        self.calls = []
+        self.play_times = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def zone_group_state(self):
+        member = (f'<ZoneGroupMember UUID="{self.uid}" '
+                  f'Location="http://{self.ip}:{self.port}/xml/device_description.xml" '
+                  f'ZoneName="{escape(self.name)}" Invisible="0" IsZoneBridge="0"/>')
+        return (f'<ZoneGroupState><ZoneGroups><ZoneGroup Coordinator="{self.uid}" ID="{self.uid}:1">'
+                f'{member}</ZoneGroup></ZoneGroups><VanishedDevices/></ZoneGroupState>')
+
+    def device_description(self):
+        return ('<?xml version="1.0" encoding="utf-8"?>'
+                '<root xmlns="urn:schemas-upnp-org:device-1-0"><device>'
+                '<deviceType>urn:schemas-upnp-org:device:ZonePlayer:1</deviceType>'
+                f'<friendlyName>{self.ip} - Sonos One</friendlyName>'
+                '<manufacturer>Sonos, Inc.</manufacturer>'
+                '<modelName>Sonos One</modelName>'
+                f'<roomName>{escape(self.name)}</roomName>'
+                f'<UDN>uuid:{self.uid}</UDN>'
+                '</device></root>')
+
+    def handle(self, action, body, received):
+        with self.lock:
+            self.calls.append((action, received))
+            if action == 'SetVolume':
+                match = re.search(r'<DesiredVolume>(\d+)</DesiredVolume>', body)
+                self.volume = int(match.group(1)) if match else self.volume
+                return {}
+            if action == 'GetVolume':
+                return {'CurrentVolume': self.volume}
+            if action == 'SetAVTransportURI':
+                match = re.search(r'<CurrentURI>(.*?)</CurrentURI>', body, re.S)
+                self.uri = match.group(1) if match else ''
+                self.state = 'STOPPED'
+                return {}
+            if action == 'Play':
+                self.state = 'PLAYING'
+                self.play_times.append(received)
+                return {}
+            if action in ('Stop', 'Pause'):
+                self.state = 'STOPPED' if action == 'Stop' else 'PAUSED_PLAYBACK'
+                return {}
+            if action == 'GetTransportInfo':
+                return {'CurrentTransportState': self.state, 'CurrentTransportStatus': 'OK', 'CurrentSpeed': '1'}
+            if action == 'GetZoneGroupState':
+                return {'ZoneGroupState': self.zone_group_state()}
+            if action == 'GetHouseholdID':
+                return {'CurrentHouseholdID': 'Sonos_FAKE'}
+            if action == 'GetZoneAttributes':
+                return {'CurrentZoneName': self.name, 'CurrentIcon': '', 'CurrentConfiguration': '1'}
+            # RemoveAllTracksFromQueue and anything else: accept silently
+            return {}
+
+    def start(self):
+        self.server = _Server((self.ip, self.port), _SonosHandler)
+        self.server.speaker = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _AladhanHandler(_QuietHandler):
+    def do_GET(self):
+        api = self.server.api
+        if api.faults.apply():
+            self.reply(500, json.dumps({'code': 500, 'status': 'Internal Server Error'}), 'application/json')
+            return
+
+        path, _, query = self.path.partition('?')
+        api.requests.append(path)
+        params = dict(pair.split('=', 1) for pair in query.split('&') if '=' in pair)
+        method = int(params.get('method', 2))
+
+        match = re.match(r'/v1/calendarByCity/(\d+)/(\d+)$', path)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            self.reply(200, json.dumps({'code': 200, 'status': 'OK',
+                                        'data': api.calendar(year, month, method)}), 'application/json')
+            return
+
+        match = re.match(r'/v1/timingsByCity(?:/(\d{2})-(\d{2})-(\d{4}))?$', path)
+        if match:
+            day = date.today()
+            if match.group(1):
+                day = date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+            self.reply(200, json.dumps({'code': 200, 'status': 'OK',
+                                        'data': api.day_entry(day, method)}), 'application/json')
+            return
+
+        self.send_error(404)
+
+
+class FakeAladhan:
+    """Aladhan-shaped API backed by the offline engine"""
+
+    def __init__(self, host='127.0.0.1', port=0, faults=None, latitude=59.2367, longitude=17.9817,
+                 timezone='Europe/Stockholm'):
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.requests = []
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def day_entry(self, day, method):
+        calculator = prayer_calc.PrayerCalculator(self.latitude, self.longitude, method, self.timezone)
+        return {
+            'timings': {name: f"{value} (CET)" for name, value in calculator.timings(day).items()},
+            'date': {
+                'readable': day.strftime('%d %b %Y'),
+                'gregorian': {'date': day.strftime('%d-%m-%Y')},
+                'hijri': {'date': ''}
+            },
+            'meta': {'latitude': self.latitude, 'longitude': self.longitude, 'timezone': self.timezone,
+                     'method': {'id': method}}
+        }
+
+    def calendar(self, year, month, method):
+        day = date(year, month, 1)
+        days = []
+        while day.month == month:
+            days.append(self.day_entry(day, method))
+            day = date.fromordinal(day.toordinal() + 1)
+        return days
+
+    def start(self):
+        self.server = _Server((self.host, self.port), _AladhanHandler)
+        self.server.api = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
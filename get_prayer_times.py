@@ -5,6 +5,11 @@ Usage:
     python get_prayer_times.py                    # Today's times
     python get_prayer_times.py 15-02-2026         # Specific date (DD-MM-YYYY)
     python get_prayer_times.py --json             # JSON output
+    python get_prayer_times.py --from 01-03-2026 --to 31-03-2026
+                                                  # Date range as a table
+    python get_prayer_times.py --from 01-01-2026 --to 31-12-2026 --csv
+                                                  # ... or --jsonl, --csv, --json, --ics
+    python get_prayer_times.py --to 31-12-2026    # From today
 """
 
 import requests
@@ -12,6 +17,8 @@ import sys
 import json
 from datetime import datetime
 import os
+import prayer_cache
+import prayer_schedule
 
 def load_config():
     """Load configuration from config.json"""
@@ -28,65 +35,100 @@ def load_config():
         return {"city": "Huddinge", "country": "Sweden", "method": 1}
 
 def get_prayer_times(date_str=None, city=None, country=None, method=None, json_output=False):
-    """Fetch prayer times from Aladhan API"""
+    """Get prayer times from the shared cache (filled from Aladhan API)"""
 
     # Load from config if not provided
-    if city is None or country is None or method is None:
-        config = load_config()
-        city = city or config.get('city', 'Huddinge')
-        country = country or config.get('country', 'Sweden')
-        method = method or config.get('method', 1)
+    location = load_config()
+    if city is not None or country is not None:
+        # Explicit city/country always goes to the API
+        location = {k: v for k, v in location.items() if k != 'source'}
+    location['city'] = city or location.get('city', 'Huddinge')
+    location['country'] = country or location.get('country', 'Sweden')
+    location['method'] = method or location.get('method', 1)
 
     # Use today's date if not provided
     if not date_str or date_str == "--json":
         date_str = datetime.now().strftime("%d-%m-%Y")
 
-    url = f"http://api.aladhan.com/v1/timingsByCity/{date_str}"
-    params = {
-        "city": city,
-        "country": country,
-        "method": method
-    }
-
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        day = datetime.strptime(date_str, "%d-%m-%Y").date()
+        day_info = prayer_cache.get_day(location, day)
+        print_timings(location['city'], location['country'], day_info['readable'], day_info['hijri'],
+                      day_info['timings'], json_output)
+
+    except requests.exceptions.RequestException as e:
+        print(f"Network error: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-        if response.status_code == 200 and data['code'] == 200:
-            timings = data['data']['timings']
-            date_info = data['data']['date']
+def print_timings(city, country, readable, hijri, timings, json_output=False):
+    """Print prayer times as JSON or human-readable text"""
+    if json_output or "--json" in sys.argv:
+        # JSON output
+        print(json.dumps({
+            "date": readable,
+            "hijri": hijri,
+            "timings": {
+                "Fajr": timings['Fajr'],
+                "Sunrise": timings['Sunrise'],
+                "Dhuhr": timings['Dhuhr'],
+                "Asr": timings['Asr'],
+                "Maghrib": timings['Maghrib'],
+                "Isha": timings['Isha']
+            }
+        }, indent=2))
+    else:
+        # Human-readable output
+        print(f"\n🕌 Prayer Times for {city}, {country}")
+        print(f"📅 Date: {readable}")
+        if hijri:
+            print(f"📆 Hijri: {hijri}")
+        print("=" * 50)
+        print(f"Fajr:    {timings['Fajr']}")
+        print(f"Sunrise: {timings['Sunrise']}")
+        print(f"Dhuhr:   {timings['Dhuhr']}")
+        print(f"Asr:     {timings['Asr']}")
+        print(f"Maghrib: {timings['Maghrib']}")
+        print(f"Isha:    {timings['Isha']}")
+        print("=" * 50)
 
-            if json_output or "--json" in sys.argv:
-                # JSON output
-                print(json.dumps({
-                    "date": date_info['readable'],
-                    "hijri": date_info['hijri']['date'],
-                    "timings": {
-                        "Fajr": timings['Fajr'],
-                        "Sunrise": timings['Sunrise'],
-                        "Dhuhr": timings['Dhuhr'],
-                        "Asr": timings['Asr'],
-                        "Maghrib": timings['Maghrib'],
-                        "Isha": timings['Isha']
-                    }
-                }, indent=2))
-            else:
-                # Human-readable output
-                print(f"\n🕌 Prayer Times for {city}, {country}")
-                print(f"📅 Date: {date_info['readable']}")
-                print(f"📆 Hijri: {date_info['hijri']['date']}")
-                print("=" * 50)
-                print(f"Fajr:    {timings['Fajr']}")
-                print(f"Sunrise: {timings['Sunrise']}")
-                print(f"Dhuhr:   {timings['Dhuhr']}")
-                print(f"Asr:     {timings['Asr']}")
-                print(f"Maghrib: {timings['Maghrib']}")
-                print(f"Isha:    {timings['Isha']}")
-                print("=" * 50)
-        else:
-            print(f"Error: {data.get('data', 'Unable to fetch prayer times')}")
-            sys.exit(1)
+def option_value(args, name):
+    """Value following --name in args, or None"""
+    if name not in args:
+        return None
+    index = args.index(name)
+    if index + 1 >= len(args):
+        print(f"Error: {name} needs a date (DD-MM-YYYY)")
+        sys.exit(1)
+    return args[index + 1]
+
+def stream_table(rows):
+    """One aligned line per day"""
+    yield "Date        " + "".join(f"{prayer:<9}" for prayer in prayer_schedule.PRAYERS).rstrip() + "\n"
+    for day, _, timings in rows:
+        yield f"{day.isoformat()}  " + "".join(f"{timings[prayer]:<9}" for prayer in prayer_schedule.PRAYERS).rstrip() + "\n"
 
+def print_range(args):
+    """Print the schedule for --from/--to (from defaults to today), a row at a time as months arrive"""
+    location = load_config()
+    output_format = next((f for f in prayer_schedule.FORMATS if f"--{f}" in args), 'table')
+    try:
+        start = option_value(args, '--from') if '--from' in args else None
+        start = datetime.strptime(start, "%d-%m-%Y").date() if start else datetime.now().date()
+        end = option_value(args, '--to')
+        end = datetime.strptime(end, "%d-%m-%Y").date() if end else start
+        start, end = prayer_schedule.parse_range(start.isoformat(), end.isoformat())
+
+        # Missing months are fetched a few at a time; rows print as soon as their month is in
+        rows = prayer_schedule.iter_month_days(location, start, end)
+        if output_format == 'table':
+            chunks = stream_table(rows)
+        else:
+            chunks = prayer_schedule.render(rows, output_format, location)
+        for chunk in chunks:
+            sys.stdout.write(chunk)
     except requests.exceptions.RequestException as e:
         print(f"Network error: {e}")
         sys.exit(1)
@@ -95,5 +137,8 @@ def get_prayer_times(date_str=None, city=None, country=None, method=None, json_o
         sys.exit(1)
 
 if __name__ == "__main__":
-    date_arg = sys.argv[1] if len(sys.argv) > 1 else None
-    get_prayer_times(date_arg)
+    if "--from" in sys.argv or "--to" in sys.argv:
+        print_range(sys.argv[1:])
+    else:
+        date_arg = sys.argv[1] if len(sys.argv) > 1 else None
+        get_prayer_times(date_arg)
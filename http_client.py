@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for upstream APIs
+One pooled keep-alive session for every Aladhan call, with bounded timeouts,
+jittered exponential retries on transient failures and optional hedging (a
+second identical request when the first is slow; the first answer wins).
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_RETRIES = 3
+# Full-jitter backoff: sleep uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 8
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'azan_http_request_seconds', 'Upstream HTTP request latency per attempt', labels=('outcome',))
+HTTP_RETRIES_TOTAL = metrics.counter('azan_http_retries_total', 'Upstream HTTP retries')
+HTTP_HEDGES_TOTAL = metrics.counter('azan_http_hedges_total', 'Hedged upstream HTTP requests sent')
+
+_session = None
+_session_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='http-hedge')
+
+
+class RetryableStatus(requests.HTTPError):
+    """Upstream answered with a status worth retrying (429/5xx)"""
+
+
+def session():
+    """The process-wide pooled session"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def _attempt(url, params, timeout):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = session().get(url, params=params, timeout=timeout)
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableStatus(f"{response.status_code} from {url}", response=response)
+        response.raise_for_status()
+        outcome = 'ok'
+        return response.json()
+    finally:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+
+def _hedged(url, params, timeout, hedge_after):
+    first = _hedge_executor.submit(_attempt, url, params, timeout)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+
+    # The first request is slow; race a second one against it
+    HTTP_HEDGES_TOTAL.inc()
+    pending = {first, _hedge_executor.submit(_attempt, url, params, timeout)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def _backoff(attempt, error):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(BACKOFF_MAX, int(retry_after)))
+    return delay
+
+
+def get_json(url, params=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, hedge_after=None):
+    """GET url and return the decoded JSON
+
+    Connection errors, timeouts and 429/5xx answers are retried up to `retries`
+    times with jittered exponential backoff; other HTTP errors raise at once.
+    With hedge_after set, a duplicate request is sent if the first hasn't
+    answered within that many seconds.
+    """
+    for attempt in range(retries + 1):
+        try:
+            if hedge_after:
+                return _hedged(url, params, timeout, hedge_after)
+            return _attempt(url, params, timeout)
+        except (requests.ConnectionError, requests.Timeout, RetryableStatus) as e:
+            if attempt == retries:
+                raise
+            delay = _backoff(attempt, e)
+            HTTP_RETRIES_TOTAL.inc()
+            logger.warning(f"Request to {url} failed ({e}); retrying in {delay:.1f}s "
+                           f"({attempt + 1}/{retries})")
+            time.sleep(delay)
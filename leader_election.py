@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Active/standby leader election
+Scheduler replicas compete for a time-limited lease and only the holder plays
+the Azan; a standby takes the lease over once the holder has failed to renew it
+for ttl seconds. The lease lives either in a file on storage both replicas can
+reach (read-modify-write under an flock; expiry uses wall-clock time, so keep
+the clocks NTP-synced) or on a small coordination endpoint started with
+"python3 leader_election.py serve", whose own clock decides expiry.
+
+The leader also publishes the prayers it has fired in the lease record, so a
+replica that takes over knows which ones it must not play again.
+
+Usage:
+    python3 leader_election.py serve [--port 8767]     # coordination endpoint
+    python3 leader_election.py status <lease>          # lease file path or endpoint URL
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+import metrics
+import state_store
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lease lasts without renewal; the holder renews every third of it
+DEFAULT_TTL = 10
+
+DEFAULT_PORT = 8767
+
+LEADER = metrics.gauge('azan_leader', 'Whether this replica holds the lease (1) or is on standby (0)')
+LEASE_ATTEMPTS_TOTAL = metrics.counter(
+    'azan_lease_attempts_total', 'Lease acquire/renew attempts by outcome (acquired, renewed, standby, error)',
+    labels=('outcome',))
+LEASE_SECONDS = metrics.histogram('azan_lease_seconds', 'Latency of lease acquire/renew calls')
+ROLE_CHANGES_TOTAL = metrics.counter(
+    'azan_role_changes_total', 'Times this replica became leader or standby', labels=('role',))
+TAKEOVER_SECONDS = metrics.histogram(
+    'azan_takeover_seconds', "Previous leader's last renewal until this replica took over",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 60, 120, 300))
+
+
+def _grant(record, holder, ttl, fired, now):
+    """(granted, new record) for holder asking for the lease at now"""
+    if record and record['holder'] != holder and record['expires_at'] > now:
+        return False, record
+    same = bool(record) and record['holder'] == holder
+    if not same and record:
+        # Keep what the previous holder fired until the new one has merged it
+        fired = sorted(set(fired) | set(record.get('fired', [])))
+    return True, {
+        'holder': holder,
+        'term': record['term'] if same else (record or {}).get('term', 0) + 1,
+        'acquired_at': record['acquired_at'] if same else now,
+        'renewed_at': now,
+        'expires_at': now + ttl,
+        'fired': list(fired)
+    }
+
+
+def _with_age(record, now):
+    """Record plus 'age': seconds since it was last renewed, by the lease's own clock"""
+    return dict(record, age=now - record['renewed_at']) if record else None
+
+
+class FileLease:
+    """Lease kept in a JSON file, e.g. on an NFS share both replicas mount"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _locked(self, change):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return change(self._read(), time.time())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def acquire(self, holder, ttl, fired=()):
+        """Take or renew the lease; returns (granted, record as it was before)"""
+        def change(record, now):
+            granted, updated = _grant(record, holder, ttl, fired, now)
+            if granted:
+                state_store.write_json_atomic(self.path, updated)
+            return granted, _with_age(record, now)
+        return self._locked(change)
+
+    def release(self, holder):
+        def change(record, now):
+            if record and record['holder'] == holder:
+                state_store.write_json_atomic(self.path, dict(record, expires_at=now))
+        self._locked(change)
+
+    def current(self):
+        return _with_age(self._read(), time.time())
+
+
+class MemoryLease:
+    """Lease held in this process; what the coordination endpoint serves"""
+
+    def __init__(self):
+        self.record = None
+        self.lock = threading.Lock()
+
+    def acquire(self, holder, ttl, fired=()):
+        with self.lock:
+            now = time.time()
+            previous = self.record
+            granted, self.record = _grant(previous, holder, ttl, fired, now)
+            return granted, _with_age(previous, now)
+
+    def release(self, holder):
+        with self.lock:
+            if self.record and self.record['holder'] == holder:
+                self.record = dict(self.record, expires_at=time.time())
+
+    def current(self):
+        with self.lock:
+            return _with_age(self.record, time.time())
+
+
+class HttpLease:
+    """Client for a coordination endpoint (python3 leader_election.py serve)"""
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        response = http_client.session().post(self.url + path, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def acquire(self, holder, ttl, fired=()):
+        result = self._post('/lease', {'holder': holder, 'ttl': ttl, 'fired': list(fired)})
+        return result['granted'], result['previous']
+
+    def release(self, holder):
+        self._post('/release', {'holder': holder})
+
+    def current(self):
+        response = http_client.session().get(self.url + '/lease', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['lease']
+
+
+def open_lease(spec):
+    """A lease from ha.lease: an http(s):// endpoint URL, or a file path (relative to the data directory)"""
+    if spec.startswith(('http://', 'https://')):
+        return HttpLease(spec)
+    return FileLease(os.path.join(state_store.DATA_DIR, spec))
+
+
+class LeaderElector:
+    """Keeps competing for the lease on a daemon thread and reports role changes
+
+    on_elected(fired) is called with the prayer keys published by the previous
+    holder when this replica becomes leader, on_demoted() when it stops being one.
+    """
+
+    def __init__(self, lease, node_id, ttl=DEFAULT_TTL, on_elected=None, on_demoted=None):
+        self.lease = lease
+        self.node_id = node_id
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.elected = False
+        self.holder = None
+        self.fired = set()
+        self.lock = threading.Lock()
+        self._last_renewed = 0.0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        LEADER.set(0)
+
+    @property
+    def is_leader(self):
+        """Elected and the lease is certainly still ours
+
+        Checked when read rather than when the renewal thread last ran, so a
+        leader whose renewals stall stops playing ttl - renew_interval after
+        the last successful one started, before any standby may take over.
+        """
+        return self.elected and time.monotonic() - self._last_renewed < self.ttl - self.renew_interval
+
+    def note_fired(self, key):
+        """Publish a fired prayer ("YYYY-MM-DD Prayer[@site]") with the next renewal, which happens now"""
+        cutoff = (date.today() - timedelta(days=1)).isoformat()
+        with self.lock:
+            self.fired = {fired for fired in self.fired if fired >= cutoff}
+            self.fired.add(key)
+        self._wake.set()
+
+    def step(self):
+        """One acquire/renew attempt"""
+        with self.lock:
+            fired = sorted(self.fired)
+        # The lease counts its expiry from (at the earliest) when the call starts
+        attempted = time.monotonic()
+        try:
+            with LEASE_SECONDS.time():
+                granted, previous = self.lease.acquire(self.node_id, self.ttl, fired)
+        except Exception as e:
+            LEASE_ATTEMPTS_TOTAL.inc(outcome='error')
+            unrenewed = time.monotonic() - self._last_renewed
+            # is_leader already went false; this makes the role change official
+            if self.elected and unrenewed > self.ttl - self.renew_interval:
+                self._demote(f"lease not renewed for {unrenewed:.1f}s ({e})")
+            else:
+                logger.warning(f"Lease renewal failed: {e}")
+            return
+
+        if not granted:
+            LEASE_ATTEMPTS_TOTAL.inc(outcome='standby')
+            self.holder = previous['holder']
+            if self.elected:
+                self._demote(f"lease is held by {previous['holder']}")
+            return
+
+        self._last_renewed = attempted
+        self.holder = self.node_id
+        if self.elected:
+            LEASE_ATTEMPTS_TOTAL.inc(outcome='renewed')
+            return
+
+        LEASE_ATTEMPTS_TOTAL.inc(outcome='acquired')
+        inherited = []
+        if previous and previous['holder'] != self.node_id:
+            inherited = previous.get('fired', [])
+            TAKEOVER_SECONDS.observe(previous['age'])
+            logger.warning(f"Took over as leader from {previous['holder']} "
+                           f"(its last renewal was {previous['age']:.1f}s ago)")
+        else:
+            logger.info(f"Elected leader as {self.node_id}")
+        with self.lock:
+            self.fired.update(inherited)
+        self.elected = True
+        LEADER.set(1)
+        ROLE_CHANGES_TOTAL.inc(role='leader')
+        if self.on_elected:
+            self.on_elected(inherited)
+
+    def _demote(self, reason):
+        logger.warning(f"Stepping down to standby: {reason}")
+        self.elected = False
+        LEADER.set(0)
+        ROLE_CHANGES_TOTAL.inc(role='standby')
+        if self.on_demoted:
+            self.on_demoted()
+
+    def start(self):
+        """Make the first attempt now (so the role is known before any job runs), then keep going"""
+        self.step()
+        if not self.is_leader:
+            logger.info(f"Standing by as {self.node_id}; {self.holder} is the leader")
+
+        def run():
+            while not self._stopped.is_set():
+                self._wake.wait(self.renew_interval)
+                self._wake.clear()
+                if self._stopped.is_set():
+                    return
+                try:
+                    self.step()
+                except Exception as e:
+                    logger.error(f"Leader election step failed: {e}")
+
+        self._thread = threading.Thread(target=run, name='leader-election', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop competing and hand the lease back so a standby takes over at its next attempt"""
+        self._stopped.set()
+        self._wake.set()
+        if self.elected:
+            try:
+                self.lease.release(self.node_id)
+            except Exception as e:
+                logger.warning(f"Failed to release the lease: {e}")
+            self.elected = False
+            LEADER.set(0)
+
+
+class _LeaseHandler(BaseHTTPRequestHandler):
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/lease':
+            self.reply(200, {'lease': self.server.lease.current()})
+        elif self.path.split('?')[0] == '/metrics':
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            holder = request['holder']
+            if self.path == '/lease':
+                granted, previous = self.server.lease.acquire(holder, float(request.get('ttl', DEFAULT_TTL)),
+                                                              request.get('fired', []))
+                self.reply(200, {'granted': granted, 'previous': previous})
+            elif self.path == '/release':
+                self.server.lease.release(holder)
+                self.reply(200, {'released': True})
+            else:
+                self.reply(404, {'error': 'Not found'})
+        except (KeyError, ValueError) as e:
+            self.reply(400, {'error': f"Bad request: {e}"})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def start_http_server(port=DEFAULT_PORT, host='0.0.0.0'):
+    """Serve a coordination endpoint (an in-memory lease) on a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _LeaseHandler)
+    server.daemon_threads = True
+    server.lease = MemoryLease()
+    threading.Thread(target=server.serve_forever, name='lease-server', daemon=True).start()
+    logger.info(f"Lease endpoint listening on port {port}")
+    return server
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Lease coordination for active/standby schedulers')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='Run a coordination endpoint')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    status = commands.add_parser('status', help='Show who holds a lease')
+    status.add_argument('lease', help='Lease file path or endpoint URL')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        start_http_server(args.port)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        record = open_lease(args.lease).current()
+        if not record:
+            print("No one has held the lease yet")
+        else:
+            state = 'expired' if record['age'] >= record['expires_at'] - record['renewed_at'] else 'held'
+            print(f"{record['holder']} ({state}, term {record['term']}, renewed {record['age']:.1f}s ago)")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Playback history store
+Records every scheduling decision and every Azan outcome (played, paused,
+disabled, failed, missed, with per-speaker latencies) in an append-only SQLite
+database next to scheduler_state.json. Events are queued and written in
+batches by a background thread so the playback path never waits on the disk;
+the web app reads the same file for /api/history.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import metrics
+import state_store
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = os.path.join(state_store.DATA_DIR, 'playback_history.db')
+
+# Days of history to keep (0 keeps everything)
+DEFAULT_RETENTION_DAYS = 365
+
+# Collect events for up to this many seconds (or this many events) per transaction
+BATCH_SECONDS = 0.5
+BATCH_SIZE = 200
+
+# Events waiting beyond this are dropped rather than let memory grow
+QUEUE_SIZE = 10000
+
+# Delete expired rows at most this often
+PRUNE_INTERVAL = 6 * 3600
+
+# Page size for queries when none (or too big a one) is asked for
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+EVENTS = ('scheduled', 'disabled', 'skipped', 'played', 'paused', 'failed', 'missed', 'standby')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prayer TEXT NOT NULL,
+    site TEXT,
+    event TEXT NOT NULL,
+    scheduled_at TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_date ON events (date);
+CREATE INDEX IF NOT EXISTS events_prayer_date ON events (prayer, date);
+"""
+
+HISTORY_EVENTS_TOTAL = metrics.counter(
+    'azan_history_events_total', 'Playback history events by result', labels=('result',))
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+_retention_days = DEFAULT_RETENTION_DAYS
+
+
+def connect(path=DB_FILE):
+    """Open the database in WAL mode (readers don't block the writer), creating it if needed"""
+    connection = sqlite3.connect(path, timeout=5)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def configure(retention_days=DEFAULT_RETENTION_DAYS):
+    global _retention_days
+    _retention_days = retention_days
+
+
+def record(event, prayer, site=None, scheduled=None, **detail):
+    """Queue an event for the writer thread; never blocks"""
+    scheduled_date = scheduled.date() if scheduled else date.today()
+    row = (datetime.now().astimezone().isoformat(), scheduled_date.isoformat(), prayer, site, event,
+           scheduled.isoformat() if scheduled else None, json.dumps(detail) if detail else None)
+    _start_writer()
+    try:
+        _queue.put_nowait(row)
+    except queue.Full:
+        HISTORY_EVENTS_TOTAL.inc(result='dropped')
+
+
+def prune(connection, retention_days):
+    """Delete events for dates older than retention_days; returns the number removed"""
+    if not retention_days:
+        return 0
+    cutoff = (date.today() - timedelta(days=retention_days)).isoformat()
+    with connection:
+        return connection.execute('DELETE FROM events WHERE date < ?', (cutoff,)).rowcount
+
+
+def _write_batches():
+    connection = None
+    pruned = 0.0
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + BATCH_SECONDS
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+
+        try:
+            connection = connection or connect()
+            with connection:
+                connection.executemany(
+                    'INSERT INTO events (recorded_at, date, prayer, site, event, scheduled_at, detail) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+            HISTORY_EVENTS_TOTAL.inc(len(batch), result='written')
+            if time.monotonic() - pruned > PRUNE_INTERVAL:
+                pruned = time.monotonic()
+                removed = prune(connection, _retention_days)
+                if removed:
+                    logger.info(f"Removed {removed} playback history events older than {_retention_days} days")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to write {len(batch)} playback history events: {e}")
+            HISTORY_EVENTS_TOTAL.inc(len(batch), result='failed')
+            if connection:
+                connection.close()
+            connection = None
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer and _writer.is_alive():
+            return
+        _writer = threading.Thread(target=_write_batches, name='history-writer', daemon=True)
+        _writer.start()
+
+
+def flush(timeout=5):
+    """Wait (up to timeout seconds) for queued events to reach the database"""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def query(start, end, prayer=None, site=None, event=None, limit=DEFAULT_LIMIT, before=None, path=DB_FILE):
+    """One page of events for prayer dates start..end, newest first
+
+    Returns (events, cursor); pass cursor back as before= for the next page
+    (None when there are no more).
+    """
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    sql = 'SELECT * FROM events WHERE date BETWEEN ? AND ?'
+    params = [start.isoformat(), end.isoformat()]
+    for column, value in (('prayer', prayer), ('site', site), ('event', event)):
+        if value:
+            sql += f' AND {column} = ?'
+            params.append(value)
+    if before:
+        sql += ' AND id < ?'
+        params.append(before)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit + 1)
+
+    if not os.path.exists(path):
+        return [], None
+    connection = connect(path)
+    try:
+        rows = connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+    events = []
+    for row in rows[:limit]:
+        entry = dict(row)
+        entry['detail'] = json.loads(entry['detail']) if entry['detail'] else {}
+        events.append(entry)
+    return events, events[-1]['id'] if len(rows) > limit else None
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Persistent prayer times cache
+Stores a month of timings per location and calculation settings (see cache_key)
+in prayer_cache/ next to scheduler_state.json, filled from Aladhan's calendar
+endpoint (or the offline engine) so a day's timings cost a local file read
+"""
+
+import calendar
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import http_client
+import prayer_calc
+import state_store
+from metrics import PRAYER_TIMES_FETCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(state_store.DATA_DIR, 'prayer_cache')
+
+# Overridable so benchmarks can point at a local stand-in
+ALADHAN_URL = os.environ.get('ALADHAN_URL', 'http://api.aladhan.com')
+
+# Send a duplicate calendar request if the first hasn't answered within this many seconds
+HEDGE_AFTER = 2.0
+
+# Start filling next month's file this many days before the month ends
+PREFETCH_DAYS = 7
+
+# Months loaded at once when filling a date range (the HTTP pool holds 8)
+RANGE_WORKERS = 4
+
+_months = {}
+_months_lock = threading.Lock()
+_prefetching = set()
+
+
+def _slug(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')
+
+
+def cache_key(location):
+    """Identify everything the timings depend on, e.g. huddinge_sweden_m1
+
+    Offline keys also carry the timezone, high latitude rule and school, e.g.
+    local_59.24_17.98_m1_europe-stockholm_anglebased_s0, so changing any of
+    them starts a new set of month files.
+    """
+    method = location.get('method', 2)
+    if prayer_calc.uses_local_calculation(location):
+        return (f"local_{location['latitude']}_{location['longitude']}_m{method}"
+                f"_{_slug(location.get('timezone') or 'system')}"
+                f"_{_slug(location.get('high_latitude_rule', 'AngleBased'))}_s{location.get('school', 0)}")
+    return f"{_slug(location['city'])}_{_slug(location['country'])}_m{method}"
+
+
+def _month_path(location, year, month):
+    return os.path.join(CACHE_DIR, f"{cache_key(location)}_{year}-{month:02d}.json")
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _fetch_month_aladhan(location, year, month):
+    """Fetch a whole month from the Aladhan calendar endpoint"""
+    url = f"{ALADHAN_URL}/v1/calendarByCity/{year}/{month}"
+    params = {
+        'city': location['city'],
+        'country': location['country'],
+        'method': location.get('method', 2)
+    }
+
+    logger.info(f"Fetching prayer calendar for {location['city']}, {location['country']} ({year}-{month:02d})")
+    with PRAYER_TIMES_FETCH_SECONDS.time(source='aladhan'):
+        data = http_client.get_json(url, params=params, hedge_after=HEDGE_AFTER)
+
+    days = {}
+    for entry in data['data']:
+        day = datetime.strptime(entry['date']['gregorian']['date'], '%d-%m-%Y').date()
+        days[day.isoformat()] = {
+            'readable': entry['date']['readable'],
+            'hijri': entry['date']['hijri']['date'],
+            'timings': {name: value.split(' ')[0] for name, value in entry['timings'].items()}
+        }
+    return days
+
+
+def _compute_month_local(location, year, month):
+    """Compute a whole month with the offline engine"""
+    calculator = prayer_calc.calculator_from_config(location)
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+
+    return {
+        day.isoformat(): {
+            'readable': day.strftime('%d %b %Y'),
+            'hijri': None,
+            'timings': timings
+        }
+        for day, timings in calculator.timings_range(start, end)
+    }
+
+
+def _read_month(path):
+    """Read a month file, reusing the parsed copy while the file is unchanged"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _months_lock:
+        cached = _months.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    with open(path, 'r') as f:
+        days = json.load(f)['days']
+
+    with _months_lock:
+        _months[path] = (mtime, days)
+    return days
+
+
+def load_month(location, year, month):
+    """Return {iso date: day} for a month, filling the cache on a miss"""
+    path = _month_path(location, year, month)
+    days = _read_month(path)
+    if days is not None:
+        return days
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Only one process fills a given month; others wait and then read it
+    with open(path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            days = _read_month(path)
+            if days is not None:
+                return days
+
+            if prayer_calc.uses_local_calculation(location):
+                with PRAYER_TIMES_FETCH_SECONDS.time(source='local'):
+                    days = _compute_month_local(location, year, month)
+            else:
+                days = _fetch_month_aladhan(location, year, month)
+
+            state_store.write_json_atomic(path, {
+                'key': cache_key(location),
+                'fetched_at': datetime.now().isoformat(),
+                'days': days
+            })
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    with _months_lock:
+        _months.pop(path, None)
+    return days
+
+
+def months_between(start, end):
+    """(year, month) for every month from start's to end's, inclusive"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = _next_month(year, month)
+
+
+def iter_months(location, months, workers=RANGE_WORKERS):
+    """Yield (year, month, days) in order, loading up to workers months at once
+
+    Cached months are plain file reads; missing ones are fetched in parallel,
+    a few months ahead of the one being yielded, so callers can start using
+    the first month while later ones are still on the way.
+    """
+    months = iter(months)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prayer-months') as pool:
+        pending = deque()
+        for year, month in months:
+            pending.append((year, month, pool.submit(load_month, location, year, month)))
+            if len(pending) >= workers:
+                break
+        while pending:
+            year, month, future = pending.popleft()
+            next_month = next(months, None)
+            if next_month:
+                pending.append((*next_month, pool.submit(load_month, location, *next_month)))
+            yield year, month, future.result()
+
+
+def _prefetch(location, year, month):
+    path = _month_path(location, year, month)
+    try:
+        load_month(location, year, month)
+        logger.info(f"Prefetched prayer times for {year}-{month:02d}")
+    except Exception as e:
+        logger.warning(f"Failed to prefetch prayer times for {year}-{month:02d}: {e}")
+    finally:
+        with _months_lock:
+            _prefetching.discard(path)
+
+
+def prefetch_next_month(location, day):
+    """Fill next month's file in the background if it is not cached yet"""
+    year, month = _next_month(day.year, day.month)
+    path = _month_path(location, year, month)
+    if os.path.exists(path):
+        return
+
+    with _months_lock:
+        if path in _prefetching:
+            return
+        _prefetching.add(path)
+
+    threading.Thread(target=_prefetch, args=(location, year, month), daemon=True).start()
+
+
+def get_day(location, day=None):
+    """Cached prayer data for one day: {'readable', 'hijri', 'timings'}"""
+    day = day or date.today()
+    days = load_month(location, day.year, day.month)
+
+    if day.day > calendar.monthrange(day.year, day.month)[1] - PREFETCH_DAYS:
+        prefetch_next_month(location, day)
+
+    return days[day.isoformat()]
+
+
+def get_timings(location, day=None):
+    """Cached timings for one day as {'Fajr': 'HH:MM', ...}"""
+    return get_day(location, day)['timings']
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Offline prayer time calculation
+Computes prayer times locally from the sun's position, using the same
+algorithm and method parameters as the Aladhan API (PrayTimes.org)
+"""
+
+import math
+from datetime import date, datetime, timedelta
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+# Aladhan method ids -> (fajr angle, isha angle or "N min" after maghrib)
+METHODS = {
+    1: {'name': 'Karachi', 'fajr': 18, 'isha': 18},
+    2: {'name': 'ISNA', 'fajr': 15, 'isha': 15},
+    3: {'name': 'MWL', 'fajr': 18, 'isha': 17},
+    4: {'name': 'Makkah', 'fajr': 18.5, 'isha': '90 min'},
+    5: {'name': 'Egypt', 'fajr': 19.5, 'isha': 17.5},
+}
+
+# Aladhan latitudeAdjustmentMethod ids
+HIGH_LATITUDE_RULES = {
+    1: 'MiddleOfTheNight',
+    2: 'OneSeventh',
+    3: 'AngleBased',
+}
+
+PRAYER_NAMES = ['Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Sunset', 'Maghrib', 'Isha', 'Imsak', 'Midnight']
+
+RISE_SET_ANGLE = 0.833
+IMSAK_MINUTES = 10
+
+
+def _fix(a, b):
+    if math.isnan(a):
+        return a
+    a = a - b * math.floor(a / b)
+    return a + b if a < 0 else a
+
+
+def _fix_angle(a):
+    return _fix(a, 360.0)
+
+
+def _fix_hour(a):
+    return _fix(a, 24.0)
+
+
+def _dsin(d):
+    return math.sin(math.radians(d))
+
+
+def _dcos(d):
+    return math.cos(math.radians(d))
+
+
+def _dtan(d):
+    return math.tan(math.radians(d))
+
+
+def _darcsin(x):
+    return math.degrees(math.asin(x))
+
+
+def _darccos(x):
+    if x < -1 or x > 1:
+        return math.nan
+    return math.degrees(math.acos(x))
+
+
+def _darctan2(y, x):
+    return math.degrees(math.atan2(y, x))
+
+
+def _darccot(x):
+    return math.degrees(math.atan(1 / x))
+
+
+def _julian(year, month, day):
+    """Julian date at midnight UT for a Gregorian calendar date"""
+    if month <= 2:
+        year -= 1
+        month += 12
+    a = math.floor(year / 100)
+    b = 2 - a + math.floor(a / 4)
+    return math.floor(365.25 * (year + 4716)) + math.floor(30.6001 * (month + 1)) + day + b - 1524.5
+
+
+def _is_minutes(value):
+    return isinstance(value, str) and value.endswith('min')
+
+
+def _value(value):
+    return float(str(value).split(' ')[0])
+
+
+def _format_time(hours):
+    """Format fractional hours as HH:MM, rounding to the nearest minute like Aladhan"""
+    if math.isnan(hours):
+        return '-----'
+    hours = _fix_hour(hours + 0.5 / 60)
+    h = int(math.floor(hours))
+    m = int(math.floor((hours - h) * 60))
+    return f"{h:02d}:{m:02d}"
+
+
+def resolve_high_latitude_rule(rule):
+    """Accept an Aladhan latitudeAdjustmentMethod id or name"""
+    if rule is None:
+        return None
+    if isinstance(rule, int) or str(rule).isdigit():
+        return HIGH_LATITUDE_RULES[int(rule)]
+    if rule not in HIGH_LATITUDE_RULES.values() and rule != 'None':
+        raise ValueError(f"Unknown high latitude rule: {rule}")
+    return None if rule == 'None' else rule
+
+
+class PrayerCalculator:
+    """Prayer time calculator for one location and method"""
+
+    def __init__(self, latitude, longitude, method=2, timezone=None,
+                 high_latitude_rule='AngleBased', school=0):
+        if int(method) not in METHODS:
+            raise ValueError(f"Unsupported calculation method: {method}")
+
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.method = int(method)
+        self.params = METHODS[self.method]
+        self.tz = ZoneInfo(timezone) if timezone and ZoneInfo else None
+        self.high_latitude_rule = resolve_high_latitude_rule(high_latitude_rule)
+        self.asr_factor = 2 if int(school) == 1 else 1
+
+        # Trigonometry that only depends on the location
+        self._sin_lat = _dsin(self.latitude)
+        self._cos_lat = _dcos(self.latitude)
+
+    def _utc_offset(self, day):
+        """UTC offset in hours for the given date (DST aware)"""
+        moment = datetime(day.year, day.month, day.day, 12)
+        if self.tz:
+            moment = moment.replace(tzinfo=self.tz)
+        else:
+            moment = moment.astimezone()
+        return moment.utcoffset().total_seconds() / 3600
+
+    @staticmethod
+    def _sun_position(jd):
+        """Declination and equation of time for a Julian date"""
+        d = jd - 2451545.0
+        g = _fix_angle(357.529 + 0.98560028 * d)
+        q = _fix_angle(280.459 + 0.98564736 * d)
+        lon = _fix_angle(q + 1.915 * _dsin(g) + 0.020 * _dsin(2 * g))
+        e = 23.439 - 0.00000036 * d
+
+        ra = _darctan2(_dcos(e) * _dsin(lon), _dcos(lon)) / 15
+        eqt = q / 15 - _fix_hour(ra)
+        decl = _darcsin(_dsin(e) * _dsin(lon))
+        return decl, eqt
+
+    def _mid_day(self, jdate, t):
+        _, eqt = self._sun_position(jdate + t)
+        return _fix_hour(12 - eqt)
+
+    def _sun_angle_time(self, jdate, angle, t, ccw=False):
+        decl, eqt = self._sun_position(jdate + t)
+        noon = _fix_hour(12 - eqt)
+        cos_h = (-_dsin(angle) - _dsin(decl) * self._sin_lat) / (_dcos(decl) * self._cos_lat)
+        h = _darccos(cos_h) / 15
+        return noon - h if ccw else noon + h
+
+    def _asr_time(self, jdate, t):
+        decl, _ = self._sun_position(jdate + t)
+        angle = -_darccot(self.asr_factor + _dtan(abs(self.latitude - decl)))
+        return self._sun_angle_time(jdate, angle, t)
+
+    def _night_portion(self, angle, night):
+        if self.high_latitude_rule == 'AngleBased':
+            return angle / 60 * night
+        if self.high_latitude_rule == 'OneSeventh':
+            return night / 7
+        return night / 2
+
+    def _adjust_high_latitude(self, t, base, angle, night, ccw=False):
+        portion = self._night_portion(angle, night)
+        if math.isnan(t):
+            diff = math.inf
+        else:
+            diff = _fix_hour(base - t) if ccw else _fix_hour(t - base)
+        if diff > portion:
+            return base - portion if ccw else base + portion
+        return t
+
+    def compute_hours(self, day):
+        """Compute prayer times for a date as fractional local hours"""
+        jdate = _julian(day.year, day.month, day.day) - self.longitude / (15 * 24)
+        fajr_angle = _value(self.params['fajr'])
+        isha = self.params['isha']
+
+        fajr = self._sun_angle_time(jdate, fajr_angle, 5 / 24, ccw=True)
+        sunrise = self._sun_angle_time(jdate, RISE_SET_ANGLE, 6 / 24, ccw=True)
+        dhuhr = self._mid_day(jdate, 12 / 24)
+        asr = self._asr_time(jdate, 13 / 24)
+        sunset = self._sun_angle_time(jdate, RISE_SET_ANGLE, 18 / 24)
+        isha_time = math.nan if _is_minutes(isha) else self._sun_angle_time(jdate, _value(isha), 18 / 24)
+
+        offset = self._utc_offset(day) - self.longitude / 15
+        fajr, sunrise, dhuhr, asr, sunset, isha_time = (
+            t + offset for t in (fajr, sunrise, dhuhr, asr, sunset, isha_time))
+
+        if self.high_latitude_rule:
+            night = _fix_hour(sunrise - sunset)
+            fajr = self._adjust_high_latitude(fajr, sunrise, fajr_angle, night, ccw=True)
+            if not _is_minutes(isha):
+                isha_time = self._adjust_high_latitude(isha_time, sunset, _value(isha), night)
+
+        maghrib = sunset
+        if _is_minutes(isha):
+            isha_time = maghrib + _value(isha) / 60
+
+        return {
+            'Fajr': fajr,
+            'Sunrise': sunrise,
+            'Dhuhr': dhuhr,
+            'Asr': asr,
+            'Sunset': sunset,
+            'Maghrib': maghrib,
+            'Isha': isha_time,
+            'Imsak': fajr - IMSAK_MINUTES / 60,
+            'Midnight': sunset + _fix_hour(sunrise - sunset) / 2,
+        }
+
+    def timings(self, day=None):
+        """Prayer times for a date as 'HH:MM' strings keyed like Aladhan's timings"""
+        day = day or date.today()
+        hours = self.compute_hours(day)
+        return {name: _format_time(hours[name]) for name in PRAYER_NAMES}
+
+    def timings_range(self, start, end):
+        """Yield (date, timings) for every day from start to end inclusive"""
+        day = start
+        while day <= end:
+            yield day, self.timings(day)
+            day += timedelta(days=1)
+
+    def timings_year(self, year):
+        """Prayer times for a whole year as {date: timings}"""
+        return dict(self.timings_range(date(year, 1, 1), date(year, 12, 31)))
+
+
+def calculator_from_config(location):
+    """Build a PrayerCalculator from the config.json location section"""
+    if location.get('latitude') is None or location.get('longitude') is None:
+        raise ValueError("Local prayer time calculation needs location.latitude and location.longitude")
+
+    return PrayerCalculator(
+        latitude=location['latitude'],
+        longitude=location['longitude'],
+        method=location.get('method', 2),
+        timezone=location.get('timezone'),
+        high_latitude_rule=location.get('high_latitude_rule', 'AngleBased'),
+        school=location.get('school', 0),
+    )
+
+
+def uses_local_calculation(location):
+    """True if config.json selects the offline engine instead of the Aladhan API"""
+    return location.get('source', 'aladhan') == 'local'
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='Compute prayer times offline')
+    parser.add_argument('--year', type=int, help='Compute a whole year and report timing')
+    args = parser.parse_args()
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+    with open(config_path, 'r') as f:
+        calculator = calculator_from_config(json.load(f)['location'])
+
+    if args.year:
+        started = time.perf_counter()
+        year = calculator.timings_year(args.year)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Computed {len(year)} days in {elapsed:.1f} ms")
+    else:
+        print(json.dumps(calculator.timings(), indent=2))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Prayer schedule range queries
+Packs a year of cached prayer times into a compact table (sorted day ordinals
+plus one array of minutes per prayer, searched with bisect) and streams any
+date range from it as JSON, JSON lines, CSV or iCalendar, one day at a time.
+"""
+
+import json
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timezone
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+import prayer_cache
+
+PRAYERS = ['Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']
+
+# Calendar events are only created for the five daily prayers
+CALENDAR_PRAYERS = ['Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']
+EVENT_DURATION = 'PT15M'
+
+FORMATS = {
+    'json': 'application/json',
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'ics': 'text/calendar; charset=utf-8',
+}
+
+# Longest range one query may ask for
+MAX_RANGE_DAYS = 731
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class YearTable:
+    """A year of prayer times: day ordinals and per-prayer minutes since midnight"""
+
+    def __init__(self, year, days):
+        self.year = year
+        self.ordinals = array('l')
+        self.minutes = {prayer: array('H') for prayer in PRAYERS}
+        self.hijri = []
+        for iso_date in sorted(days):
+            day = days[iso_date]
+            self.ordinals.append(date.fromisoformat(iso_date).toordinal())
+            for prayer in PRAYERS:
+                hours, minutes = day['timings'][prayer].split(' ')[0].split(':')
+                self.minutes[prayer].append(int(hours) * 60 + int(minutes))
+            self.hijri.append(day.get('hijri'))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def _row(self, index):
+        timings = {prayer: '%02d:%02d' % divmod(self.minutes[prayer][index], 60) for prayer in PRAYERS}
+        return date.fromordinal(self.ordinals[index]), self.hijri[index], timings
+
+    def get(self, day):
+        """(date, hijri, timings) for one day; KeyError if the table doesn't have it"""
+        index = bisect_left(self.ordinals, day.toordinal())
+        if index == len(self.ordinals) or self.ordinals[index] != day.toordinal():
+            raise KeyError(day.isoformat())
+        return self._row(index)
+
+    def range(self, start, end):
+        """Yield (date, hijri, timings) for the days from start to end inclusive"""
+        first = bisect_left(self.ordinals, start.toordinal())
+        last = bisect_right(self.ordinals, end.toordinal())
+        for index in range(first, last):
+            yield self._row(index)
+
+
+def get_table(location, year):
+    """The YearTable for a location and year, built once per process from the month cache"""
+    key = (prayer_cache.cache_key(location), year)
+    with _tables_lock:
+        table = _tables.get(key)
+    if table:
+        return table
+
+    days = {}
+    months = [(year, month) for month in range(1, 13)]
+    for _, _, month_days in prayer_cache.iter_months(location, months):
+        days.update(month_days)
+    table = YearTable(year, days)
+
+    with _tables_lock:
+        _tables[key] = table
+    return table
+
+
+def iter_days(location, start, end):
+    """Yield (date, hijri, timings) from start to end inclusive, loading one year at a time"""
+    for year in range(start.year, end.year + 1):
+        table = get_table(location, year)
+        yield from table.range(max(start, date(year, 1, 1)), min(end, date(year, 12, 31)))
+
+
+def iter_month_days(location, start, end):
+    """Like iter_days, but straight from the month files as each one arrives
+
+    Nothing waits for a whole year, so the first rows are out while later
+    months are still being fetched.
+    """
+    for _, _, days in prayer_cache.iter_months(location, prayer_cache.months_between(start, end)):
+        for iso_date in sorted(days):
+            day = date.fromisoformat(iso_date)
+            if start <= day <= end:
+                timings = days[iso_date]['timings']
+                yield day, days[iso_date].get('hijri'), {prayer: timings[prayer].split(' ')[0] for prayer in PRAYERS}
+
+
+def parse_range(start, end, today=None):
+    """Validate a from/to pair of ISO dates (to defaults to from, from to today)"""
+    start = date.fromisoformat(start) if start else (today or date.today())
+    end = date.fromisoformat(end) if end else start
+    if end < start:
+        raise ValueError("'to' is before 'from'")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Range is longer than {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def stream_json(rows):
+    """A JSON array of {date, hijri, timings}, one day per line"""
+    yield '['
+    separator = '\n'
+    for day, hijri, timings in rows:
+        yield separator + json.dumps({'date': day.isoformat(), 'hijri': hijri, 'timings': timings})
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def stream_jsonl(rows):
+    for day, hijri, timings in rows:
+        yield json.dumps({'date': day.isoformat(), 'hijri': hijri, 'timings': timings}) + '\n'
+
+
+def stream_csv(rows):
+    yield 'date,' + ','.join(PRAYERS) + '\r\n'
+    for day, _, timings in rows:
+        yield day.isoformat() + ',' + ','.join(timings[prayer] for prayer in PRAYERS) + '\r\n'
+
+
+def stream_ics(rows, location):
+    """An iCalendar feed with one event per prayer
+
+    Times are given in UTC when location.timezone is known, so no VTIMEZONE
+    block is needed; otherwise they are floating local times.
+    """
+    tz_name = location.get('timezone')
+    tz = ZoneInfo(tz_name) if tz_name and ZoneInfo else None
+    place = '\\, '.join(str(location[key]) for key in ('city', 'country') if location.get(key))
+    uid_suffix = prayer_cache.cache_key(location)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    yield ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Sonos Azan Scheduler//Prayer Times//EN\r\n'
+           'CALSCALE:GREGORIAN\r\n')
+    for day, _, timings in rows:
+        for prayer in CALENDAR_PRAYERS:
+            hours, minutes = map(int, timings[prayer].split(':'))
+            start = datetime(day.year, day.month, day.day, hours, minutes)
+            if tz:
+                dtstart = start.replace(tzinfo=tz).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+            else:
+                dtstart = start.strftime('%Y%m%dT%H%M%S')
+            event = (f"BEGIN:VEVENT\r\nUID:{day.isoformat()}-{prayer}-{uid_suffix}@sonos-azan-scheduler\r\n"
+                     f"DTSTAMP:{stamp}\r\nDTSTART:{dtstart}\r\nDURATION:{EVENT_DURATION}\r\n"
+                     f"SUMMARY:{prayer}\r\n")
+            if place:
+                event += f"LOCATION:{place}\r\n"
+            yield event + "END:VEVENT\r\n"
+    yield 'END:VCALENDAR\r\n'
+
+
+def render(rows, output_format, location):
+    """Text chunks for (date, hijri, timings) rows in the given format"""
+    if output_format == 'json':
+        return stream_json(rows)
+    if output_format == 'jsonl':
+        return stream_jsonl(rows)
+    if output_format == 'csv':
+        return stream_csv(rows)
+    if output_format == 'ics':
+        return stream_ics(rows, location)
+    raise ValueError(f"Unknown format: {output_format} (use {', '.join(FORMATS)})")
+
+
+def stream(location, start, end, output_format='json'):
+    """Yield the schedule from start to end as text chunks in the given format"""
+    return render(iter_days(location, start, end), output_format, location)
+
+
+def batched(chunks, size=64):
+    """Join text chunks into fewer, larger ones for network writes"""
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
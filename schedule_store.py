@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Durable daily schedule
+Keeps each site's computed schedule for the day (prayer times, the location
+they were computed for, and which prayers have already fired) in schedule.json
+next to scheduler_state.json. A restarted scheduler rebuilds its jobs from it
+straight away instead of waiting on the prayer times source, and knows which
+prayers it must not play twice.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import state_store
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_FILE = os.path.join(state_store.DATA_DIR, 'schedule.json')
+
+_lock = threading.Lock()
+
+
+def _read():
+    try:
+        with open(SCHEDULE_FILE, 'r') as f:
+            return json.load(f).get('sites', {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable schedule store: {e}")
+        return {}
+
+
+def load(site, day, location_key):
+    """The stored schedule for a site if it is for this day and location, else None
+
+    Returns {'prayer_times': {prayer: datetime}, 'fired': [prayer, ...]}.
+    """
+    with _lock:
+        entry = _read().get(site or '')
+    if not entry or entry.get('date') != day.isoformat() or entry.get('location') != location_key:
+        return None
+    return {
+        'prayer_times': {prayer: datetime.fromisoformat(value) for prayer, value in entry['prayer_times'].items()},
+        'fired': list(entry.get('fired', []))
+    }
+
+
+def _update(site, change):
+    """Replace a site's entry with change(entry); returns the new entry"""
+    with _lock:
+        sites = _read()
+        entry = change(sites.get(site or ''))
+        if entry is None or entry == sites.get(site or ''):
+            return entry
+        sites[site or ''] = entry
+        try:
+            state_store.write_json_atomic(SCHEDULE_FILE, {
+                'saved_at': datetime.now().isoformat(),
+                'sites': sites
+            }, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to save schedule store: {e}")
+        return entry
+
+
+def save(site, day, location_key, prayer_times):
+    """Store a site's schedule for a day; returns its fired prayers (kept if the day is unchanged)"""
+    def change(entry):
+        same_day = entry and entry.get('date') == day.isoformat() and entry.get('location') == location_key
+        return {
+            'date': day.isoformat(),
+            'location': location_key,
+            'prayer_times': {prayer: value.isoformat() for prayer, value in prayer_times.items()},
+            'fired': entry.get('fired', []) if same_day else []
+        }
+    return _update(site, change)['fired']
+
+
+def mark_fired(site, day, prayer):
+    """Record that a prayer of the stored day has been played (or attempted)"""
+    def change(entry):
+        if not entry or entry.get('date') != day.isoformat():
+            return entry
+        if prayer not in entry.get('fired', []):
+            entry = dict(entry, fired=entry.get('fired', []) + [prayer])
+        return entry
+    _update(site, change)
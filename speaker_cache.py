@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Persistent Sonos speaker discovery cache
+Keeps the last discovery results (UID, room name, IP, model) in speaker_cache.json
+next to scheduler_state.json so startup can connect without an SSDP search, and
+revalidates them on a background thread so a speaker that moved to a new IP is
+picked up without a restart. Where multicast doesn't get through (Docker bridge
+networking, some mesh Wi-Fi), configured subnets are probed on port 1400 instead.
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+import soco
+
+import metrics
+import state_store
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.path.join(state_store.DATA_DIR, 'speaker_cache.json')
+
+# Seconds to listen for SSDP replies
+DISCOVERY_TIMEOUT = 5
+
+# A rediscovery requested within this many seconds of the last one reuses its results
+REDISCOVER_MIN_INTERVAL = 30
+
+# Subnet scan: port the Sonos UPnP server listens on, per-host timeout, parallel probes
+SONOS_PORT = 1400
+SCAN_TIMEOUT = 0.3
+SCAN_WORKERS = 64
+# Refuse to scan networks bigger than this many hosts (a /20)
+MAX_SCAN_HOSTS = 4096
+
+DISCOVERIES_TOTAL = metrics.counter(
+    'azan_speaker_discoveries_total', 'Sonos discovery runs by trigger, method and outcome',
+    labels=('reason', 'method', 'outcome'))
+
+_records = None
+_records_signature = None
+_records_lock = threading.Lock()
+_discover_lock = threading.Lock()
+_last_discovery = 0.0
+_listeners = []
+_revalidator = None
+_revalidation = {'interval': 0, 'networks': ()}
+_revalidate_wake = threading.Event()
+
+
+def _describe(device):
+    """Cache record for a discovered device"""
+    try:
+        model = device.get_speaker_info().get('model_name')
+    except Exception:
+        model = None
+    return {
+        'uid': device.uid,
+        'name': device.player_name,
+        'ip': device.ip_address,
+        'model': model,
+        'seen_at': datetime.now().isoformat()
+    }
+
+
+def _signature():
+    try:
+        st = os.stat(CACHE_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def load():
+    """Cached speaker records as {uid: record}; re-read only when the file has changed
+
+    Another process (the scheduler, for the web container) may rewrite the
+    file after a rediscovery.
+    """
+    global _records, _records_signature
+    signature = _signature()
+    with _records_lock:
+        if _records is None or (signature is not None and signature != _records_signature):
+            try:
+                with open(CACHE_FILE, 'r') as f:
+                    _records = json.load(f).get('speakers', {})
+            except FileNotFoundError:
+                _records = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable speaker cache: {e}")
+                _records = _records or {}
+            _records_signature = signature
+        return dict(_records)
+
+
+def find(name=None, uid=None, ip=None):
+    """First cached record matching uid, room name or IP (any record if none given)"""
+    for record in load().values():
+        if uid and record['uid'] == uid:
+            return record
+        if name and record['name'] == name:
+            return record
+        if ip and record['ip'] == ip:
+            return record
+        if not (name or uid or ip):
+            return record
+    return None
+
+
+def configured_networks(config):
+    """Subnets to scan from sonos.scan_networks (a CIDR string or a list of them)"""
+    networks = config.get('sonos', {}).get('scan_networks') or []
+    return [networks] if isinstance(networks, str) else list(networks)
+
+
+def _probe(ip, timeout):
+    """Return ip if a Sonos device description is served there"""
+    try:
+        socket.create_connection((ip, SONOS_PORT), timeout=timeout).close()
+        response = requests.get(f"http://{ip}:{SONOS_PORT}/xml/device_description.xml", timeout=(timeout, 1.0))
+    except (OSError, requests.RequestException):
+        return None
+    return ip if response.ok and b'<manufacturer>Sonos' in response.content else None
+
+
+def scan(networks, timeout=SCAN_TIMEOUT, workers=SCAN_WORKERS):
+    """Probe every host in the given CIDR ranges concurrently; returns the visible SoCo devices
+
+    Each responder's zone group topology supplies the visible players in its
+    household (visible_zones, as soco.discover() returns), so bonded
+    satellites and Subs, which share their room's name, are left out.
+    """
+    hosts = []
+    for network in networks:
+        network = ipaddress.ip_network(network, strict=False)
+        if network.num_addresses > MAX_SCAN_HOSTS:
+            logger.warning(f"Not scanning {network}: larger than {MAX_SCAN_HOSTS} addresses")
+            continue
+        hosts.extend(str(host) for host in network.hosts())
+    if not hosts:
+        return set()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(workers, len(hosts)), thread_name_prefix='sonos-scan') as pool:
+        responders = [ip for ip in pool.map(lambda ip: _probe(ip, timeout), hosts) if ip]
+
+    devices = {}
+    for ip in responders:
+        if ip in devices:
+            continue
+        try:
+            devices.update((device.ip_address, device) for device in soco.SoCo(ip).visible_zones)
+        except Exception as e:
+            logger.warning(f"Failed to read Sonos topology from {ip}: {e}")
+    logger.info(f"Scanned {len(hosts)} addresses in {time.monotonic() - started:.1f}s, "
+                f"found {len(devices)} Sonos speaker(s)")
+    return set(devices.values())
+
+
+def _notify(records):
+    for callback in list(_listeners):
+        try:
+            callback(dict(records))
+        except Exception as e:
+            logger.error(f"Speaker cache listener failed: {e}")
+
+
+def discover(timeout=DISCOVERY_TIMEOUT, reason='startup', networks=()):
+    """Run an SSDP discovery, merge the results into the cache and return them
+
+    If multicast finds nothing and networks (CIDR ranges) are given, they are
+    scanned instead.
+
+    Speakers that don't answer keep their last known record, so a missed
+    multicast reply doesn't lose a speaker. Returns {uid: record} for the
+    speakers that answered.
+    """
+    global _records, _records_signature, _last_discovery
+    with _discover_lock:
+        method = 'multicast'
+        try:
+            devices = soco.discover(timeout=timeout) or set()
+            if not devices and networks:
+                logger.info(f"No multicast discovery replies; scanning {', '.join(networks)}")
+                method = 'scan'
+                devices = scan(networks)
+            found = {}
+            for device in devices:
+                try:
+                    record = _describe(device)
+                except Exception as e:
+                    logger.warning(f"Skipping Sonos device at {device.ip_address}: {e}")
+                    continue
+                found[record['uid']] = record
+        except Exception:
+            DISCOVERIES_TOTAL.inc(reason=reason, method=method, outcome='error')
+            raise
+        _last_discovery = time.monotonic()
+        DISCOVERIES_TOTAL.inc(reason=reason, method=method, outcome='found' if found else 'none')
+
+        if not found:
+            return found
+
+        previous = load()
+        merged = dict(previous, **found)
+        try:
+            state_store.write_json_atomic(CACHE_FILE, {
+                'updated_at': datetime.now().isoformat(),
+                'speakers': merged
+            }, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to save speaker cache: {e}")
+        with _records_lock:
+            _records = merged
+            _records_signature = _signature()
+
+        changed = False
+        for uid, record in found.items():
+            before = previous.get(uid)
+            if not before or (before['ip'], before['name']) != (record['ip'], record['name']):
+                changed = True
+            if before and before['ip'] != record['ip']:
+                logger.info(f"Sonos speaker '{record['name']}' moved from {before['ip']} to {record['ip']}")
+    if changed:
+        _notify(merged)
+    return found
+
+
+def rediscover(reason='unreachable', networks=()):
+    """Discover again unless another caller just did; returns {uid: record}"""
+    with _discover_lock:
+        recent = time.monotonic() - _last_discovery < REDISCOVER_MIN_INTERVAL
+    if recent:
+        return load()
+    return discover(timeout=DISCOVERY_TIMEOUT, reason=reason, networks=networks)
+
+
+def add_listener(callback):
+    """Call callback({uid: record}) whenever discovery changes a record"""
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def start_revalidator(interval, networks=()):
+    """Rediscover every interval seconds on a daemon thread
+
+    The first pass runs straight away unless a discovery has just happened,
+    so a stale cache used at startup is corrected within seconds. Calling it
+    again switches the running thread to the new interval and networks; an
+    interval of 0 suspends it.
+    """
+    global _revalidator
+    _revalidation.update(interval=interval, networks=tuple(networks))
+    if _revalidator and _revalidator.is_alive():
+        _revalidate_wake.set()
+        return _revalidator
+    if not interval:
+        return None
+
+    def revalidate():
+        while True:
+            interval, networks = _revalidation['interval'], _revalidation['networks']
+            if not interval:
+                _revalidate_wake.wait()
+                _revalidate_wake.clear()
+                continue
+            age = time.monotonic() - _last_discovery if _last_discovery else interval
+            if age >= interval:
+                try:
+                    discover(reason='revalidate', networks=networks)
+                except Exception as e:
+                    logger.warning(f"Speaker revalidation failed: {e}")
+                age = 0
+            if _revalidate_wake.wait(interval - age):
+                _revalidate_wake.clear()
+
+    _revalidator = threading.Thread(target=revalidate, name='speaker-revalidator', daemon=True)
+    _revalidator.start()
+    return _revalidator
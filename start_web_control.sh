@@ -4,4 +4,4 @@
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 cd "$SCRIPT_DIR"
 source venv/bin/activate
-python web_control.py
+python web_asgi.py
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Shared scheduler state store
+Reads and writes scheduler_state.json for the scheduler, the CLI and the web app.
+Writes are atomic (temp file + rename) and serialized with an advisory file lock;
+reads are cached until the file's inode/mtime/size changes.
+"""
+
+import errno
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directory shared between containers (state file, caches); defaults to the script directory
+DATA_DIR = os.environ.get('AZAN_DATA_DIR', SCRIPT_DIR)
+STATE_FILE = os.path.join(DATA_DIR, 'scheduler_state.json')
+LOCK_FILE = STATE_FILE + '.lock'
+
+DEFAULT_STATE = {"paused": False, "pause_until": None}
+
+_cache = {'signature': None, 'state': None}
+_cache_lock = threading.Lock()
+_listeners = []
+_watcher = None
+
+
+def write_json_atomic(path, payload, indent=None):
+    """Write JSON via a temp file and rename so readers never see partial data"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(payload, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        os.unlink(tmp_path)
+        if e.errno not in (errno.EBUSY, errno.EXDEV):
+            raise
+        # The file itself is bind-mounted (e.g. a single-file Docker volume) and
+        # can't be replaced; fall back to rewriting it in place
+        with open(path, 'w') as f:
+            json.dump(payload, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def locked(exclusive=True):
+    """Hold the advisory state lock (shared across processes and containers)"""
+    with open(LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _signature():
+    try:
+        st = os.stat(STATE_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _notify(state):
+    for callback in list(_listeners):
+        try:
+            callback(dict(state))
+        except Exception as e:
+            logger.error(f"State listener failed: {e}")
+
+
+def _load():
+    """Parse the state file (caller holds the lock); returns (signature, state)"""
+    signature = _signature()
+    if signature is None:
+        return None, dict(DEFAULT_STATE)
+    with open(STATE_FILE, 'r') as f:
+        return signature, json.load(f)
+
+
+def read_state():
+    """Current scheduler state; only re-parses the file when it has changed"""
+    signature = _signature()
+    with _cache_lock:
+        if signature is not None and signature == _cache['signature']:
+            return dict(_cache['state'])
+
+    if signature is None:
+        state = dict(DEFAULT_STATE)
+    else:
+        with locked(exclusive=False):
+            signature, state = _load()
+
+    with _cache_lock:
+        changed = _cache['state'] is not None and state != _cache['state']
+        _cache['signature'] = signature
+        _cache['state'] = state
+
+    if changed:
+        _notify(state)
+    return dict(state)
+
+
+def _store(state):
+    """Write the state (caller holds the lock); returns True if it changed"""
+    write_json_atomic(STATE_FILE, state, indent=2)
+    with _cache_lock:
+        changed = state != _cache['state']
+        _cache['signature'] = _signature()
+        _cache['state'] = dict(state)
+    return changed
+
+
+def write_state(state):
+    """Replace the scheduler state atomically"""
+    with locked():
+        changed = _store(state)
+    # Listeners run after the lock is released so they can read or update the state themselves
+    if changed:
+        _notify(state)
+
+
+def update_state(**changes):
+    """Read-modify-write under the lock so concurrent updates can't be lost"""
+    with locked():
+        _, state = _load()
+        state.update(changes)
+        changed = _store(state)
+    if changed:
+        _notify(state)
+    return state
+
+
+def add_listener(callback):
+    """Call callback(state) whenever a change to the state is seen"""
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def start_watcher(interval=1.0):
+    """Poll the state file on a daemon thread so listeners hear about external changes"""
+    global _watcher
+    if _watcher and _watcher.is_alive():
+        return _watcher
+
+    def watch():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            try:
+                read_state()
+            except Exception as e:
+                logger.error(f"Error watching state file: {e}")
+
+    _watcher = threading.Thread(target=watch, name='state-watcher', daemon=True)
+    _watcher.start()
+    return _watcher
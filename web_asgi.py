@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) server for the web control interface
+Serves the same page and API as web_control.py from one event loop under
+uvicorn: the page is pre-rendered and gzipped with an ETag, status is shared
+between polling clients, SSE subscribers are asyncio queues rather than parked
+threads, and the blocking calls (control channel, Sonos, state file) run on a
+small thread pool so they never stall the loop.
+
+Usage:
+    python3 web_asgi.py                   # uvicorn on web.port (falls back to Flask)
+    uvicorn web_asgi:app --port 8080
+"""
+
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, parse_qsl
+
+import metrics
+import prayer_schedule
+import web_control
+from web_control import broadcaster
+
+# Threads for blocking work; a dozen phones only ever need a few at once
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='web')
+
+
+async def _blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+class _AsyncSubscriber:
+    """Broadcaster subscriber that hands statuses to an event loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=16)
+
+    def _put(self, status):
+        if self.queue.full():
+            # Slow client; drop its backlog and send the latest status
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        self.queue.put_nowait(status)
+
+    def put(self, status):
+        self.put_nowait(status)
+
+    def put_nowait(self, status):
+        self.loop.call_soon_threadsafe(self._put, status)
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+async def _send(send, status, body=b'', headers=(), content_type=None):
+    headers = list(headers)
+    if content_type:
+        headers.append(('Content-Type', content_type))
+    headers.append(('Content-Length', str(len(body))))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode(), value.encode()) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, payload, status=200, headers=()):
+    await _send(send, status, json.dumps(payload).encode(), headers, 'application/json')
+
+
+async def index(scope, receive, send):
+    request_headers = _headers(scope)
+    status, headers, body = web_control.page_response(request_headers.get('if-none-match'),
+                                                      request_headers.get('accept-encoding'))
+    await _send(send, status, body, headers)
+
+
+async def api_status(scope, receive, send):
+    await _send_json(send, await _blocking(web_control.cached_status))
+
+
+async def api_prayer_times(scope, receive, send):
+    times, etag = await _blocking(web_control.get_todays_prayer_times)
+    if not times:
+        await _send_json(send, {"error": "Unable to fetch prayer times"}, 500)
+        return
+
+    # Let the browser reuse it briefly, then revalidate (304) until midnight
+    max_age = max(0, min(60, web_control.seconds_until_midnight()))
+    headers = [('ETag', f'"{etag}"'), ('Cache-Control', f'private, max-age={max_age}')]
+    if etag in _headers(scope).get('if-none-match', ''):
+        await _send(send, 304, headers=headers)
+    else:
+        await _send_json(send, {"times": times}, headers=headers)
+
+
+async def api_events(scope, receive, send):
+    """Server-Sent Events stream of status changes"""
+    subscriber = broadcaster.subscribe(_AsyncSubscriber(asyncio.get_running_loop()))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+        while not disconnected.done():
+            get = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait({get, disconnected}, timeout=web_control.KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                chunk = f"event: status\ndata: {json.dumps(get.result())}\n\n"
+            else:
+                get.cancel()
+                chunk = ': keepalive\n\n'
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(subscriber)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def api_schedule(scope, receive, send):
+    """Prayer times for any date range, streamed a batch of days at a time"""
+    try:
+        location, start, end, output_format = web_control.schedule_request(
+            dict(parse_qsl(scope['query_string'].decode())))
+    except ValueError as e:
+        await _send_json(send, {"error": str(e)}, 400)
+        return
+
+    # Filling the cache for a year can block, so every batch is produced off the loop
+    chunks = prayer_schedule.batched(prayer_schedule.stream(location, start, end, output_format))
+    try:
+        chunk = await _blocking(next, chunks, None)
+    except Exception as e:
+        await _send_json(send, {"error": f"Unable to fetch prayer times: {e}"}, 502)
+        return
+
+    headers = web_control.schedule_headers(start, end, output_format)
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(name.lower().encode(), value.encode()) for name, value in headers]})
+    while chunk is not None:
+        await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        chunk = await _blocking(next, chunks, None)
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def api_history(scope, receive, send):
+    payload, status = await _blocking(web_control.history_page, dict(parse_qsl(scope['query_string'].decode())))
+    await _send_json(send, payload, status)
+
+
+async def api_pause(scope, receive, send):
+    minutes = parse_qs(scope['query_string'].decode()).get('minutes', [None])[0]
+    try:
+        minutes = int(minutes) if minutes else None
+    except ValueError:
+        minutes = None
+    payload, status = await _blocking(web_control.pause_scheduler, minutes)
+    await _send_json(send, payload, status)
+
+
+async def api_resume(scope, receive, send):
+    payload, status = await _blocking(web_control.resume_scheduler)
+    await _send_json(send, payload, status)
+
+
+async def api_stop(scope, receive, send):
+    payload, status = await _blocking(web_control.stop_playback)
+    await _send_json(send, payload, status)
+
+
+async def api_metrics(scope, receive, send):
+    await _send(send, 200, metrics.render().encode(), content_type=metrics.CONTENT_TYPE)
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('GET', '/api/status'): api_status,
+    ('GET', '/api/prayer-times'): api_prayer_times,
+    ('GET', '/api/events'): api_events,
+    ('GET', '/api/schedule'): api_schedule,
+    ('GET', '/api/history'): api_history,
+    ('POST', '/api/pause'): api_pause,
+    ('POST', '/api/resume'): api_resume,
+    ('POST', '/api/stop'): api_stop,
+    ('GET', '/metrics'): api_metrics,
+}
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] in ('lifespan.startup', 'lifespan.shutdown'):
+                await send({'type': message['type'] + '.complete'})
+                if message['type'] == 'lifespan.shutdown':
+                    return
+    if scope['type'] != 'http':
+        return
+
+    method = 'GET' if scope['method'] == 'HEAD' else scope['method']
+    handler = ROUTES.get((method, scope['path']))
+    if not handler:
+        known = any(path == scope['path'] for _, path in ROUTES)
+        await _send_json(send, {"error": "Method not allowed" if known else "Not found"}, 405 if known else 404)
+        return
+
+    started = time.perf_counter()
+    try:
+        await handler(scope, receive, send)
+    finally:
+        if handler is not api_events:
+            metrics.WEB_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                                endpoint=handler.__name__, method=scope['method'])
+
+
+if __name__ == '__main__':
+    port = web_control.configured_port()
+    web_control.print_banner(port)
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is not installed; falling back to Flask's built-in server")
+        web_control.app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+    else:
+        uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning')
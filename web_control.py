@@ -1,53 +1,102 @@
 #!/usr/bin/env python3
 """Simple web interface to control Azan scheduler from phone"""
 
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import gzip
+import hashlib
+import itertools
 import json
 import os
-from datetime import datetime, timedelta
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
 import subprocess
-import requests
+import control_channel
+import metrics
+import playback_history
+import prayer_cache
+import prayer_schedule
+import speaker_cache
+import state_store
+from state_store import read_state, update_state
 
 app = Flask(__name__)
 
 # Use script directory for config files (works on both Mac and LXC)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-STATE_FILE = os.path.join(SCRIPT_DIR, 'scheduler_state.json')
+STATE_FILE = state_store.STATE_FILE
 CONFIG_FILE = os.path.join(SCRIPT_DIR, 'config.json')
 
+# Parsed config.json, re-read only when the file changes
+_config_memo = {'mtime': None, 'config': None}
+_config_lock = threading.Lock()
+
+# The AzanScheduler when this app runs inside the scheduler process (web.embedded)
+_scheduler = None
+
+def attach_scheduler(scheduler):
+    """Serve from inside the scheduler: call it directly instead of over the control channel"""
+    global _scheduler, CONFIG_FILE
+    _scheduler = scheduler
+    CONFIG_FILE = os.path.abspath(scheduler.config_file)
+
 def load_config():
     """Load configuration"""
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
-
-def fetch_prayer_times():
-    """Fetch today's prayer times from API"""
+    mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    with _config_lock:
+        if _config_memo['mtime'] != mtime:
+            with open(CONFIG_FILE, 'r') as f:
+                _config_memo['config'] = json.load(f)
+            _config_memo['mtime'] = mtime
+        return _config_memo['config']
+
+def fetch_prayer_times(location=None):
+    """Get today's prayer times from the shared prayer times cache"""
     try:
-        config = load_config()
-        city = config['location']['city']
-        country = config['location']['country']
-        method = config['location'].get('method', 1)
-
-        today = datetime.now().strftime("%d-%m-%Y")
-        url = f"http://api.aladhan.com/v1/timingsByCity/{today}"
-        params = {"city": city, "country": country, "method": method}
-
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
-
-        if response.status_code == 200 and data['code'] == 200:
-            timings = data['data']['timings']
-            return {
-                'Fajr': timings['Fajr'].split(' ')[0],
-                'Dhuhr': timings['Dhuhr'].split(' ')[0],
-                'Asr': timings['Asr'].split(' ')[0],
-                'Maghrib': timings['Maghrib'].split(' ')[0],
-                'Isha': timings['Isha'].split(' ')[0]
-            }
+        timings = prayer_cache.get_timings(location or load_config()['location'])
+        return {prayer: timings[prayer] for prayer in ['Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']}
     except Exception as e:
         print(f"Error fetching prayer times: {e}")
     return None
 
+# Today's prayer times, shared by every request until midnight or a location change
+_prayer_times_memo = {'key': None, 'times': None, 'etag': None}
+_prayer_times_lock = threading.Lock()
+
+def get_todays_prayer_times():
+    """Return (times, etag) for today, fetching at most once per day and location"""
+    try:
+        location = load_config()['location']
+        key = (date.today().isoformat(), prayer_cache.cache_key(location))
+    except Exception as e:
+        print(f"Error fetching prayer times: {e}")
+        return None, None
+    memo = _prayer_times_memo
+    if memo['key'] == key:
+        return memo['times'], memo['etag']
+
+    # Single-flight: concurrent misses wait here for the one fetch in progress
+    with _prayer_times_lock:
+        if memo['key'] == key:
+            return memo['times'], memo['etag']
+
+        times = fetch_prayer_times(location)
+        if not times:
+            return None, None
+
+        payload = json.dumps(times, sort_keys=True).encode()
+        memo['etag'] = hashlib.sha1(' '.join(key).encode() + payload).hexdigest()
+        memo['times'] = times
+        memo['key'] = key
+        return times, memo['etag']
+
+def seconds_until_midnight():
+    """Seconds left until today's prayer times expire"""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return int((midnight - now).total_seconds())
+
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
 <html>
@@ -280,34 +329,40 @@ HTML_TEMPLATE = '''
             }
         }
 
+        function renderStatus(data, nextPrayer) {
+            const statusDiv = document.getElementById('status');
+            const infoDiv = document.getElementById('info');
+
+            if (data.paused) {
+                statusDiv.className = 'status paused';
+                if (data.pause_until) {
+                    statusDiv.textContent = `⏸️ PAUSED until ${data.pause_until}`;
+                    infoDiv.textContent = `Scheduler will auto-resume at ${data.pause_until}`;
+                } else {
+                    statusDiv.textContent = '⏸️ PAUSED indefinitely';
+                    infoDiv.textContent = 'Azan will not play until you resume';
+                }
+            } else {
+                statusDiv.className = 'status running';
+                statusDiv.textContent = '▶️ RUNNING';
+                if (data.playing) {
+                    infoDiv.textContent = '🔊 Azan is playing';
+                } else if (nextPrayer) {
+                    infoDiv.textContent = `Next Azan: ${nextPrayer}`;
+                } else {
+                    infoDiv.textContent = 'Azan scheduler is active';
+                }
+            }
+        }
+
         async function updateStatus() {
             try {
                 const response = await fetch('/api/status');
                 const data = await response.json();
-                const statusDiv = document.getElementById('status');
-                const infoDiv = document.getElementById('info');
 
                 // Update prayer times
                 const nextPrayer = await updatePrayerTimes();
-
-                if (data.paused) {
-                    statusDiv.className = 'status paused';
-                    if (data.pause_until) {
-                        statusDiv.textContent = `⏸️ PAUSED until ${data.pause_until}`;
-                        infoDiv.textContent = `Scheduler will auto-resume at ${data.pause_until}`;
-                    } else {
-                        statusDiv.textContent = '⏸️ PAUSED indefinitely';
-                        infoDiv.textContent = 'Azan will not play until you resume';
-                    }
-                } else {
-                    statusDiv.className = 'status running';
-                    statusDiv.textContent = '▶️ RUNNING';
-                    if (nextPrayer) {
-                        infoDiv.textContent = `Next Azan: ${nextPrayer}`;
-                    } else {
-                        infoDiv.textContent = 'Azan scheduler is active';
-                    }
-                }
+                renderStatus(data, nextPrayer);
             } catch (error) {
                 console.error('Error updating status:', error);
                 document.getElementById('info').textContent = '❌ Connection error';
@@ -318,8 +373,8 @@ HTML_TEMPLATE = '''
             const infoDiv = document.getElementById('info');
             infoDiv.textContent = '⏹️ Stopping playback...';
             try {
-                await fetch('/api/stop', { method: 'POST' });
-                infoDiv.textContent = '✅ Playback stopped';
+                const response = await fetch('/api/stop', { method: 'POST' });
+                infoDiv.textContent = response.ok ? '✅ Playback stopped' : '❌ Error stopping playback';
                 setTimeout(() => {
                     updateStatus();
                 }, 2000);
@@ -355,87 +410,387 @@ HTML_TEMPLATE = '''
             }
         }
 
-        // Update status every 3 seconds
-        setInterval(updateStatus, 3000);
-        updateStatus();
+        // Poll every 3 seconds only while the event stream is unavailable
+        let pollTimer = null;
+
+        function startPolling() {
+            if (pollTimer) return;
+            pollTimer = setInterval(updateStatus, 3000);
+            updateStatus();
+        }
+
+        function stopPolling() {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+
+        function connectEvents() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+
+            const source = new EventSource('/api/events');
+            source.addEventListener('status', async (event) => {
+                stopPolling();
+                const data = JSON.parse(event.data);
+                const nextPrayer = await updatePrayerTimes();
+                renderStatus(data, nextPrayer);
+            });
+            source.onerror = () => {
+                // The browser reconnects on its own; poll until it does
+                startPolling();
+                if (source.readyState === EventSource.CLOSED) {
+                    setTimeout(connectEvents, 5000);
+                }
+            };
+        }
+
+        connectEvents();
     </script>
 </body>
 </html>
 '''
 
-def read_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    return {"paused": False, "pause_until": None}
+# The page has no per-request content, so it is rendered and compressed once
+PAGE = HTML_TEMPLATE.encode()
+PAGE_GZIP = gzip.compress(PAGE, compresslevel=9)
+PAGE_ETAG = hashlib.sha1(PAGE).hexdigest()
+
+def page_response(if_none_match, accept_encoding):
+    """(status, headers, body) for the control page, honouring ETags and gzip"""
+    headers = [('ETag', f'"{PAGE_ETAG}"'), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+    if if_none_match and PAGE_ETAG in if_none_match:
+        return 304, headers, b''
+    body = PAGE
+    if 'gzip' in (accept_encoding or ''):
+        body = PAGE_GZIP
+        headers.append(('Content-Encoding', 'gzip'))
+    headers.append(('Content-Type', 'text/html; charset=utf-8'))
+    return 200, headers, body
+
+def next_prayer_name(times, now=None):
+    """Name of the next prayer today, or None once Isha has passed"""
+    if not times:
+        return None
+    now = now or datetime.now()
+    current = now.strftime('%H:%M')
+    for prayer in ['Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']:
+        if times.get(prayer, '') > current:
+            return prayer
+    return None
 
-def write_state(state):
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=2)
+def scheduler_status():
+    """Live status from the running scheduler, or None if it isn't reachable"""
+    try:
+        if _scheduler:
+            return _scheduler.status()
+        return control_channel.send_command('status', timeout=0.5,
+                                            address=control_channel.configured_address(load_config()))
+    except Exception:
+        return None
+
+def build_status(playing=None):
+    """Current scheduler status as shown on the page"""
+    live = scheduler_status()
+    if live:
+        pause_until = live.get('pause_until')
+        return {
+            "paused": live['paused'],
+            "pause_until": datetime.fromisoformat(pause_until).strftime('%I:%M %p') if pause_until else None,
+            "next_prayer": live.get('next_prayer'),
+            "playing": playing
+        }
+
+    # Scheduler not reachable: reconstruct from the state file
+    state = read_state()
+    paused = state.get('paused', False)
+    pause_until = None
+
+    if paused and state.get('pause_until'):
+        pause_time = datetime.fromisoformat(state['pause_until'])
+        if datetime.now() >= pause_time:
+            # Pause has expired; the scheduler resumes on its next check
+            paused = False
+        else:
+            pause_until = pause_time.strftime('%I:%M %p')
+
+    times, _ = get_todays_prayer_times()
+    return {
+        "paused": paused,
+        "pause_until": pause_until,
+        "next_prayer": next_prayer_name(times),
+        "playing": playing
+    }
+
+def speaker_ips(sonos_config):
+    """IPs of the speakers one sonos section selects, resolved like the scheduler does (from the cache)"""
+    if sonos_config.get('speakers'):
+        ips = []
+        for entry in sonos_config['speakers']:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            record = None if entry.get('ip') else speaker_cache.find(name=entry['name'])
+            ip = entry.get('ip') or (record['ip'] if record else None)
+            if ip:
+                ips.append(ip)
+        return ips
+    if sonos_config.get('speaker_ip'):
+        return [sonos_config['speaker_ip']]
+    record = speaker_cache.find(name=sonos_config.get('speaker_name'))
+    return [record['ip']] if record else []
+
+def get_speakers():
+    """Every configured speaker of every site, as SoCo devices"""
+    if _scheduler:
+        # Reuse the scheduler's connections (they follow IP changes too)
+        return [speaker['device'] for site in _scheduler.sites for speaker in site.speakers]
+
+    import soco
+    config = load_config()
+    sections = [dict(config.get('sonos', {}), **site.get('sonos', {})) for site in config.get('sites') or []]
+    ips = []
+    for sonos_config in sections or [config.get('sonos', {})]:
+        ips.extend(ip for ip in speaker_ips(sonos_config) if ip not in ips)
+    return [soco.SoCo(ip) for ip in ips]
+
+def speaker_is_playing():
+    """True if any speaker is playing, False if none is, None if unknown"""
+    try:
+        speakers = get_speakers()
+        if not speakers:
+            return None
+        return any(speaker.get_current_transport_info()['current_transport_state'] == 'PLAYING'
+                   for speaker in speakers)
+    except Exception:
+        return None
+
+# How often the broadcaster re-checks state, and how often it asks the speaker
+STATUS_CHECK_SECONDS = 1
+PLAYBACK_CHECK_SECONDS = 5
+KEEPALIVE_SECONDS = 15
+
+class StatusBroadcaster:
+    """Watches scheduler status on one thread and pushes changes to SSE subscribers"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.status = None
+        self.playing = None
+        self.playback_checked_at = 0
+
+    def subscribe(self, subscriber=None):
+        subscriber = subscriber or queue.Queue(maxsize=16)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.status is not None:
+                subscriber.put(self.status)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def notify(self, playback=False):
+        """Re-check status immediately (e.g. after a pause/resume or stop)"""
+        if playback:
+            self.playback_checked_at = 0
+        self.wakeup.set()
+
+    def _publish(self, status):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(status)
+            except queue.Full:
+                # Slow client; drop its backlog and send the latest status
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(status)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+
+            try:
+                if time.monotonic() - self.playback_checked_at >= PLAYBACK_CHECK_SECONDS:
+                    self.playing = speaker_is_playing()
+                    self.playback_checked_at = time.monotonic()
+
+                status = build_status(playing=self.playing)
+                if status != self.status:
+                    self.status = status
+                    self._publish(status)
+            except Exception as e:
+                print(f"Error checking status: {e}")
+
+            self.wakeup.wait(STATUS_CHECK_SECONDS)
+            self.wakeup.clear()
+
+broadcaster = StatusBroadcaster()
+
+# Status served to polling clients, shared for STATUS_CHECK_SECONDS
+_status_memo = {'at': 0, 'status': None}
+_status_lock = threading.Lock()
+
+def cached_status():
+    """Current status, computed at most once per STATUS_CHECK_SECONDS however many clients poll"""
+    with _status_lock:
+        if time.monotonic() - _status_memo['at'] >= STATUS_CHECK_SECONDS:
+            _status_memo['status'] = build_status(playing=broadcaster.playing)
+            _status_memo['at'] = time.monotonic()
+        return _status_memo['status']
+
+def invalidate_status():
+    _status_memo['at'] = 0
+
+# Push pause/resume from any process (CLI, scheduler, this app) straight to subscribers
+state_store.add_listener(lambda state: broadcaster.notify())
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        metrics.WEB_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                            endpoint=request.endpoint or 'unknown', method=request.method)
+    return response
+
+@app.route('/metrics')
+def api_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    status, headers, body = page_response(request.headers.get('If-None-Match'),
+                                          request.headers.get('Accept-Encoding'))
+    return Response(body, status=status, headers=headers)
 
 @app.route('/api/status')
 def api_status():
-    state = read_state()
-    result = {
-        "paused": state.get('paused', False),
-        "pause_until": None,
-        "next_prayer": None
-    }
-
-    if state.get('pause_until'):
-        pause_time = datetime.fromisoformat(state['pause_until'])
-        result['pause_until'] = pause_time.strftime('%I:%M %p')
-
-    return jsonify(result)
+    return jsonify(cached_status())
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream of status changes"""
+    subscriber = broadcaster.subscribe()
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    status = subscriber.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def send_to_scheduler(action, **params):
+    """Send a command to the running scheduler; None if it isn't reachable"""
+    try:
+        if _scheduler:
+            result = _scheduler.handle_command(dict(params, action=action))
+        else:
+            result = control_channel.send_command(action, address=control_channel.configured_address(load_config()),
+                                                  **params)
+        invalidate_status()
+        broadcaster.notify()
+        return result
+    except control_channel.SchedulerUnavailable:
+        return None
+
+def pause_scheduler(minutes=None):
+    """Pause, through the running scheduler if possible; returns (payload, status code)"""
+    if minutes is not None and minutes <= 0:
+        return {"error": "minutes must be a positive number"}, 400
+    # Let the running scheduler apply it immediately; fall back to the state file
+    if not send_to_scheduler('pause', minutes=minutes):
+        pause_until = datetime.now() + timedelta(minutes=minutes) if minutes else None
+        update_state(paused=True, pause_until=pause_until.isoformat() if pause_until else None)
+        invalidate_status()
+    return {"status": "paused"}, 200
+
+def resume_scheduler():
+    if not send_to_scheduler('resume'):
+        update_state(paused=False, pause_until=None)
+        invalidate_status()
+    return {"status": "resumed"}, 200
+
+def stop_playback():
+    """Stop every configured speaker; returns (payload, status code)"""
+    try:
+        speakers = get_speakers()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}, 500
+    if not speakers:
+        return {"status": "error", "message": "No configured speaker found"}, 500
+
+    errors = []
+    for speaker in speakers:
+        try:
+            speaker.stop()
+        except Exception as e:
+            errors.append(f"{speaker.ip_address}: {e}")
+    broadcaster.notify(playback=True)
+    if errors:
+        return {"status": "error", "message": "; ".join(errors)}, 500
+    return {"status": "stopped"}, 200
 
 @app.route('/api/pause', methods=['POST'])
 def api_pause():
-    minutes = request.args.get('minutes', type=int)
-    state = read_state()
-    state['paused'] = True
-
-    if minutes:
-        pause_until = datetime.now() + timedelta(minutes=minutes)
-        state['pause_until'] = pause_until.isoformat()
-    else:
-        state['pause_until'] = None
-
-    write_state(state)
-    return jsonify({"status": "paused"})
+    payload, status = pause_scheduler(request.args.get('minutes', type=int))
+    return jsonify(payload), status
 
 @app.route('/api/resume', methods=['POST'])
 def api_resume():
-    state = read_state()
-    state['paused'] = False
-    state['pause_until'] = None
-    write_state(state)
-    return jsonify({"status": "resumed"})
+    payload, status = resume_scheduler()
+    return jsonify(payload), status
 
 @app.route('/api/stop', methods=['POST'])
 def api_stop():
-    try:
-        import soco
-        config = load_config()
-        speaker_ip = config.get('sonos', {}).get('speaker_ip', '10.75.30.94')
-        speaker = soco.SoCo(speaker_ip)
-        speaker.stop()
-        return jsonify({"status": "stopped"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    payload, status = stop_playback()
+    return jsonify(payload), status
 
 @app.route('/api/prayer-times')
 def api_prayer_times():
-    times = fetch_prayer_times()
+    times, etag = get_todays_prayer_times()
     if times:
-        return jsonify({"times": times})
+        response = jsonify({"times": times})
+        response.set_etag(etag)
+        # Let the browser reuse it briefly, then revalidate (304) until midnight
+        response.cache_control.private = True
+        response.cache_control.max_age = max(0, min(60, seconds_until_midnight()))
+        return response.make_conditional(request)
     else:
         return jsonify({"error": "Unable to fetch prayer times"}), 500
 
-if __name__ == '__main__':
+def configured_port():
+    """Port the web interface listens on (web.port, default 8080)"""
+    return load_config().get('web', {}).get('port', 8080)
+
+def print_banner(port):
     import socket
     hostname = socket.gethostname()
     local_ip = socket.gethostbyname(hostname)
@@ -443,8 +798,74 @@ if __name__ == '__main__':
     print(f"🕌 Azan Control Web Interface")
     print(f"{'='*60}")
     print(f"\nAccess from your phone:")
-    print(f"  http://{local_ip}:8080")
+    print(f"  http://{local_ip}:{port}")
     print(f"\nOr from this Mac:")
-    print(f"  http://localhost:8080")
+    print(f"  http://localhost:{port}")
     print(f"\n{'='*60}\n")
-    app.run(host='0.0.0.0', port=8080, debug=False)
+
+def schedule_request(args):
+    """Validate /api/schedule arguments; returns (location, start, end, format)"""
+    output_format = args.get('format', 'json')
+    if output_format not in prayer_schedule.FORMATS:
+        raise ValueError(f"Unknown format: {output_format} (use {', '.join(prayer_schedule.FORMATS)})")
+    start, end = prayer_schedule.parse_range(args.get('from'), args.get('to'))
+    return load_config()['location'], start, end, output_format
+
+def schedule_headers(start, end, output_format):
+    headers = [('Content-Type', prayer_schedule.FORMATS[output_format])]
+    if output_format != 'json':
+        headers.append(('Content-Disposition',
+                        f'attachment; filename="prayer-times-{start}-{end}.{output_format}"'))
+    return headers
+
+@app.route('/api/schedule')
+def api_schedule():
+    """Prayer times for any date range (?from=&to= as YYYY-MM-DD, format=json|csv|ics), streamed"""
+    try:
+        location, start, end, output_format = schedule_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    chunks = prayer_schedule.batched(prayer_schedule.stream(location, start, end, output_format))
+    try:
+        # The first batch loads the year; fail with a status code rather than mid-stream
+        first = next(chunks)
+    except Exception as e:
+        return jsonify({"error": f"Unable to fetch prayer times: {e}"}), 502
+
+    return Response(stream_with_context(itertools.chain([first], chunks)),
+                    headers=schedule_headers(start, end, output_format))
+
+# Days of history returned when no range is given
+HISTORY_DAYS = 7
+
+def history_page(args):
+    """Query the playback history for /api/history arguments; returns (payload, status)"""
+    try:
+        today = date.today()
+        start, end = prayer_schedule.parse_range(args.get('from') or (today - timedelta(days=HISTORY_DAYS)).isoformat(),
+                                                 args.get('to') or today.isoformat())
+        limit = int(args.get('limit') or playback_history.DEFAULT_LIMIT)
+        before = int(args['before']) if args.get('before') else None
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if args.get('event') and args['event'] not in playback_history.EVENTS:
+        return {"error": f"Unknown event: {args['event']} (use {', '.join(playback_history.EVENTS)})"}, 400
+
+    try:
+        events, cursor = playback_history.query(start, end, prayer=args.get('prayer'), site=args.get('site'),
+                                                event=args.get('event'), limit=limit, before=before)
+    except Exception as e:
+        return {"error": f"Unable to read playback history: {e}"}, 500
+    return {"from": start.isoformat(), "to": end.isoformat(), "events": events, "next": cursor}, 200
+
+@app.route('/api/history')
+def api_history():
+    """Playback history, newest first (?from=&to=&prayer=&site=&event=&limit=&before=)"""
+    payload, status = history_page(request.args)
+    return jsonify(payload), status
+
+if __name__ == '__main__':
+    port = configured_port()
+    print_banner(port)
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)